@@ -0,0 +1,88 @@
+"""Micro-benchmark: per-element Nitter extraction vs one batched page.evaluate
+
+Usage: python bench/bench_nitter_extract.py [--rounds 20]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from playwright.async_api import async_playwright
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from crawl_state import tweet_id_from_url
+from netter_crawler import TIMELINE_EXTRACT_JS, parse_timeline_payload
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'nitter_profile.html')
+
+
+async def extract_per_element(page):
+    """The previous extraction: several awaited CDP calls per timeline item"""
+    username_element = await page.query_selector('.profile-card-username')
+    username = await username_element.inner_text() if username_element else ""
+    tweets = []
+    for tweet in (await page.query_selector_all('.timeline-item'))[:4]:
+        if await tweet.query_selector('.retweet-header'):
+            continue
+        tweet_link = await tweet.query_selector('.tweet-link')
+        tweet_url = await tweet_link.get_attribute('href') if tweet_link else ""
+        if tweet_url:
+            tweet_url = f"https://nitter.net{tweet_url}"
+        tweet_content = await tweet.query_selector('.tweet-content')
+        text = await tweet_content.inner_text() if tweet_content else ""
+        time_element = await tweet.query_selector('.tweet-date a')
+        timestamp = await time_element.get_attribute('title') if time_element else ""
+        metrics = {}
+        stats_container = await tweet.query_selector('.tweet-stats')
+        if stats_container:
+            for key, icon in (('reply', 'icon-comment'), ('retweet', 'icon-retweet'), ('like', 'icon-heart')):
+                stat = await stats_container.query_selector(f'.tweet-stat:has(.{icon})')
+                if stat:
+                    stat_text = await stat.inner_text()
+                    digits = ''.join(filter(str.isdigit, stat_text))
+                    metrics[key] = int(digits) if digits else 0
+        # The status ID the crawler records alongside each tweet
+        tweets.append({'id': tweet_id_from_url(tweet_url), 'text': text, 'timestamp': timestamp, 'url': tweet_url,
+                       'metrics': metrics})
+    return username, tweets
+
+
+async def extract_batched(page):
+    return parse_timeline_payload(await page.evaluate(TIMELINE_EXTRACT_JS))
+
+
+async def time_rounds(extract, page, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = await extract(page)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return result, timings[len(timings) // 2]
+
+
+async def main(rounds):
+    with open(FIXTURE, encoding='utf-8') as f:
+        html = f.read()
+
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.set_content(html)
+
+        legacy, legacy_median = await time_rounds(extract_per_element, page, rounds)
+        batched, batched_median = await time_rounds(extract_batched, page, rounds)
+        await browser.close()
+
+    if legacy != batched:
+        print("WARNING: extraction results differ")
+    print(f"per-element: {legacy_median * 1000:.2f} ms (median of {rounds})")
+    print(f"batched:     {batched_median * 1000:.2f} ms (median of {rounds})")
+    print(f"speedup:     {legacy_median / batched_median:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    asyncio.run(main(parser.parse_args().rounds))
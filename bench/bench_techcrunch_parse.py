@@ -0,0 +1,70 @@
+"""Micro-benchmark: TechCrunch listing link extraction with each parser in LINK_PARSERS
+
+Usage: python bench/bench_techcrunch_parse.py [--rounds 50] [--fixture PATH]
+
+tracemalloc only sees allocations made through Python's allocator, so the
+peak reported for selectolax leaves out lexbor's own C-side tree.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from techcrunch_parse import LINK_PARSERS
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'techcrunch_latest.html')
+
+
+def median_time(parse, html, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        parse(html)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def peak_memory(parse, html):
+    tracemalloc.start()
+    parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(rounds, fixture):
+    with open(fixture, 'rb') as f:
+        html = f.read()
+    print(f"{os.path.basename(fixture)}: {len(html) / 1024:.0f} KiB")
+
+    results = {}
+    baseline = None
+    for name, parse in LINK_PARSERS.items():
+        links = [(a['url'], a['title']) for a in parse(html)]
+        results[name] = links
+        elapsed = median_time(parse, html, rounds)
+        peak = peak_memory(parse, html)
+        if name == 'bs4':
+            baseline = elapsed, peak
+        print(f"{name:<11} {elapsed * 1000:8.2f} ms  peak {peak / 1024:8.0f} KiB  {len(links)} links")
+
+    reference = results['bs4']
+    for name, links in results.items():
+        if links != reference:
+            print(f"WARNING: {name} results differ from bs4")
+    if baseline:
+        for name, parse in LINK_PARSERS.items():
+            if name != 'bs4':
+                print(f"{name} vs bs4: {baseline[0] / median_time(parse, html, rounds):.1f}x faster, "
+                      f"peak memory {peak_memory(parse, html) / baseline[1]:.1%} of bs4")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--fixture', default=FIXTURE)
+    args = parser.parse_args()
+    main(args.rounds, args.fixture)
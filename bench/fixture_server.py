@@ -0,0 +1,117 @@
+"""Local HTTP server replaying recorded Nitter, X and TechCrunch responses
+
+Usage: python bench/fixture_server.py [--port 8765] [--latency-ms 50] [--jitter-ms 20] [--error-rate 0.05]
+
+Routes:
+  /{username}                                Nitter profile page
+  /i/api/graphql/{query_id}/UserTweets       X timeline GraphQL JSON
+  /latest/ and /latest/page/{n}/             TechCrunch listing page
+"""
+import argparse
+import asyncio
+import os
+import random
+
+from aiohttp import web
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+NITTER_FIXTURE = os.path.join(FIXTURES, 'nitter_profile.html')
+X_TIMELINE_FIXTURE = os.path.join(FIXTURES, 'x_user_tweets.json')
+TECHCRUNCH_FIXTURE = os.path.join(FIXTURES, 'techcrunch_latest.html')
+
+# The recorded Nitter page belongs to this account
+FIXTURE_USERNAME = b'sama'
+
+
+def read_fixture(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class FixtureServer:
+    """aiohttp app serving the fixtures with injected latency and errors"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.nitter_page = read_fixture(NITTER_FIXTURE)
+        self.x_timeline = read_fixture(X_TIMELINE_FIXTURE)
+        self.techcrunch_page = read_fixture(TECHCRUNCH_FIXTURE)
+        self.runner = None
+        self.url = None
+
+    @web.middleware
+    async def inject(self, request, handler):
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=self.error_status, text='injected error', headers={'Retry-After': '0'})
+        return await handler(request)
+
+    def app(self):
+        app = web.Application(middlewares=[self.inject])
+        app.router.add_get('/latest/', self.techcrunch)
+        app.router.add_get('/latest/page/{page}/', self.techcrunch)
+        app.router.add_get('/i/api/graphql/{query_id}/{operation}', self.x_graphql)
+        app.router.add_get('/{username}', self.nitter_profile)
+        return app
+
+    async def nitter_profile(self, request):
+        # Same page for every profile, relabelled with the requested username
+        body = self.nitter_page.replace(FIXTURE_USERNAME, request.match_info['username'].encode('utf-8'))
+        return web.Response(body=body, content_type='text/html', charset='utf-8')
+
+    async def x_graphql(self, request):
+        if request.match_info['operation'] not in ('UserTweets', 'UserTweetsAndReplies'):
+            raise web.HTTPNotFound()
+        return web.Response(body=self.x_timeline, content_type='application/json')
+
+    async def techcrunch(self, request):
+        return web.Response(body=self.techcrunch_page, content_type='text/html', charset='utf-8')
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start serving; port 0 picks a free port. Returns the base URL"""
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+async def serve(args):
+    server = FixtureServer(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                           error_rate=args.error_rate, error_status=args.error_status)
+    url = await server.start(args.host, args.port)
+    print(f"Serving fixtures on {url} (Ctrl+C to stop)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--error-status', type=int, default=503)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
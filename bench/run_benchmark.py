@@ -0,0 +1,261 @@
+"""Offline crawler benchmark against the local fixture server
+
+Usage: python bench/run_benchmark.py [--profiles 200] [--concurrency 8] [--latency-ms 50] [--error-rate 0.02]
+                                     [--save-baseline bench/baseline.json | --compare bench/baseline.json]
+
+Drives NitterCrawler.crawl_profile (HTTP fast path), TwitterCrawler.get_tweets
+(GraphQL capture path) and TechCrunchCrawler.crawl against fixture_server.py,
+then reports throughput, p50/p95 latency per stage and peak RSS. The browser
+paths are not exercised: they need Chromium, and for X a logged-in Chrome.
+TechCrunch is skipped when crawl4ai is not installed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from collections import defaultdict
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from fixture_server import FixtureServer
+from netter_crawler import NitterCrawler, NitterHttpFetcher
+from nitter_pool import NitterInstancePool
+from rate_limiter import HostRateLimiter
+from twitter_crawler import TwitterCrawler, TimelineCapture
+
+# Regression tolerance when comparing against a baseline
+DEFAULT_TOLERANCE = 0.15
+
+
+def unthrottled_limiter():
+    """The fixture server is local, so the per-host limits only add noise"""
+    return HostRateLimiter(limits={'127.0.0.1': (1e6, 1e6, 1e6)}, jitter=0)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def summary(self):
+        return {stage: {'count': len(values),
+                        'p50_ms': round(percentile(values, 0.5) * 1000, 3),
+                        'p95_ms': round(percentile(values, 0.95) * 1000, 3)}
+                for stage, values in sorted(self.samples.items()) if values}
+
+
+class TimedFetcher:
+    """NitterHttpFetcher that records how long each fetch took"""
+
+    def __init__(self, fetcher, timer):
+        self.fetcher = fetcher
+        self.timer = timer
+
+    async def fetch(self, url):
+        started = time.perf_counter()
+        try:
+            return await self.fetcher.fetch(url)
+        finally:
+            self.timer.add('nitter.fetch', time.perf_counter() - started)
+
+
+async def run_pool(items, concurrency, handle):
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            await handle(queue.get_nowait())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def bench_nitter(server_url, profiles, concurrency, timer):
+    fetcher = await NitterHttpFetcher(limit=concurrency * 2).start()
+    crawler = NitterCrawler(rate_limiter=unthrottled_limiter(), http_fetcher=TimedFetcher(fetcher, timer),
+                            pool=NitterInstancePool([server_url]), max_attempts=1)
+    succeeded = 0
+
+    async def crawl(url):
+        nonlocal succeeded
+        started = time.perf_counter()
+        result = await crawler.crawl_profile(url)
+        timer.add('nitter.profile', time.perf_counter() - started)
+        succeeded += result['success']
+
+    started = time.perf_counter()
+    try:
+        await run_pool([f"https://nitter.net/user{i}" for i in range(profiles)], concurrency, crawl)
+    finally:
+        await fetcher.close()
+    elapsed = time.perf_counter() - started
+    return {'profiles': profiles, 'succeeded': succeeded, 'wall_s': round(elapsed, 3),
+            'profiles_per_sec': round(profiles / elapsed, 2)}
+
+
+async def bench_x(server_url, profiles, concurrency, timer):
+    crawler = TwitterCrawler(rate_limiter=unthrottled_limiter())
+    succeeded = 0
+
+    async def crawl(index):
+        nonlocal succeeded
+        url = f"{server_url}/i/api/graphql/bench/UserTweets?screen_name=user{index}"
+        started = time.perf_counter()
+        await crawler.rate_limiter.acquire(url)
+        async with session.get(url) as response:
+            payload = await response.json() if response.status == 200 else None
+        timer.add('x.fetch', time.perf_counter() - started)
+        if payload is None:
+            return
+        capture = TimelineCapture()
+        capture.payloads.append(payload)
+        started = time.perf_counter()
+        tweets = await crawler.get_tweets(None, capture=capture)
+        timer.add('x.parse', time.perf_counter() - started)
+        succeeded += bool(tweets)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency * 2)) as session:
+        await run_pool(range(profiles), concurrency, crawl)
+    elapsed = time.perf_counter() - started
+    return {'profiles': profiles, 'succeeded': succeeded, 'wall_s': round(elapsed, 3),
+            'profiles_per_sec': round(profiles / elapsed, 2)}
+
+
+async def bench_techcrunch(server_url, pages, concurrency, timer):
+    try:
+        from techcrunch_crawler import TechCrunchCrawler
+    except ImportError as e:
+        print(f"Skipping TechCrunch: {e}")
+        return None
+    crawler = TechCrunchCrawler(rate_limiter=unthrottled_limiter(), base_url=f"{server_url}/latest/",
+                                concurrency=concurrency)
+    fetch_page = crawler.fetch_page
+
+    async def timed_fetch_page(*args):
+        started = time.perf_counter()
+        try:
+            return await fetch_page(*args)
+        finally:
+            timer.add('techcrunch.page', time.perf_counter() - started)
+
+    crawler.fetch_page = timed_fetch_page
+    started = time.perf_counter()
+    articles = await crawler.crawl(num_pages=pages)
+    elapsed = time.perf_counter() - started
+    return {'pages': pages, 'articles': len(articles), 'wall_s': round(elapsed, 3),
+            'pages_per_sec': round(pages / elapsed, 2)}
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def flatten(report):
+    """Comparable metrics as {name: (value, higher_is_better)}"""
+    metrics = {}
+    for name, result in report['results'].items():
+        for key in ('profiles_per_sec', 'pages_per_sec'):
+            if result and key in result:
+                metrics[f"{name}.{key}"] = (result[key], True)
+    for stage, summary in report['stages'].items():
+        metrics[f"{stage}.p50_ms"] = (summary['p50_ms'], False)
+        metrics[f"{stage}.p95_ms"] = (summary['p95_ms'], False)
+    metrics['peak_rss_mib'] = (report['peak_rss_mib'], False)
+    return metrics
+
+
+def compare(report, baseline, tolerance):
+    """Print current vs baseline; returns the names of regressed metrics"""
+    if baseline.get('config') != report['config']:
+        print("WARNING: baseline was recorded with a different configuration")
+    current = flatten(report)
+    previous = flatten(baseline)
+    regressions = []
+    print(f"{'metric':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, (value, higher_is_better) in current.items():
+        if name not in previous:
+            continue
+        old = previous[name][0]
+        change = (value - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = '  REGRESSION' if worse > tolerance else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:<28} {old:>10} {value:>10} {change:>+8.1%}{flag}")
+    return regressions
+
+
+async def run(args):
+    server = FixtureServer(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                           error_rate=args.error_rate, seed=args.seed)
+    server_url = await server.start()
+    timer = StageTimer()
+    try:
+        results = {
+            'nitter': await bench_nitter(server_url, args.profiles, args.concurrency, timer),
+            'x': await bench_x(server_url, args.profiles, args.concurrency, timer),
+            'techcrunch': await bench_techcrunch(server_url, args.pages, args.concurrency, timer),
+        }
+    finally:
+        await server.stop()
+    return {
+        'config': {'profiles': args.profiles, 'pages': args.pages, 'concurrency': args.concurrency,
+                   'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate},
+        'results': results,
+        'stages': timer.summary(),
+        'peak_rss_mib': peak_rss_mib(),
+        'server': {'requests': server.requests, 'injected_errors': server.errors},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', type=int, default=200)
+    parser.add_argument('--pages', type=int, default=8, help="TechCrunch listing pages")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save-baseline', metavar='PATH', help="write this run's report as the baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare against a saved baseline, exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--verbose', action='store_true', help="keep the crawlers' INFO logging")
+    args = parser.parse_args()
+
+    # The crawler modules configure INFO logging on import
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
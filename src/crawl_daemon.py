@@ -0,0 +1,370 @@
+"""Long-running Nitter crawler: warm browser pool, interval runs and a local control endpoint
+
+Usage: python crawl_daemon.py [--interval 60] [--concurrency 3] [--port 8787]
+
+  curl localhost:8787/status                                  run state, last run, browser pool
+  curl -X POST localhost:8787/crawl                           crawl every profile now
+  curl -X POST localhost:8787/crawl -d '{"urls": ["sama"]}'   crawl only these profiles
+  curl localhost:8787/metrics                                 last run's metrics, Prometheus text
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from aiohttp import web
+from playwright.async_api import async_playwright
+
+from crawl_state import CrawlStateStore
+from netter_crawler import (NitterCrawler, NitterHttpFetcher, NITTER_URLS, NITTER_STATE_FILE, NITTER_CHECKPOINT_FILE,
+                            NITTER_DEAD_LETTER_FILE, NITTER_METRICS_FILE, DEFAULT_CONCURRENCY, CONTEXT_OPTIONS,
+                            launch_browser, new_crawler_page, run_crawl)
+from nitter_pool import NitterInstancePool, DEFAULT_NITTER_INSTANCES
+from page_cache import PageCache, DEFAULT_CACHE_DIR
+from rate_limiter import HostRateLimiter
+from resource_blocker import ResourceBlocker, NITTER_BLOCK_TYPES, TRACKER_DOMAINS, split_domains
+from tweet_index import TweetIndex
+from tweet_store import TweetStore, DEFAULT_STORE_PATH
+
+DEFAULT_INTERVAL_MINUTES = 60
+DEFAULT_PORT = 8787
+
+# Runs over only some profiles checkpoint here, leaving a crashed full run's checkpoint for the next full run
+SUBSET_CHECKPOINT_FILE = 'nitter_results/nitter_results_subset_checkpoint.jsonl'
+
+# A page is replaced after this many navigations, or once its JS heap passes the threshold
+DEFAULT_MAX_NAVIGATIONS = 50
+DEFAULT_MAX_HEAP_MB = 256
+
+# Chromium's performance.memory is coarse without --enable-precise-memory-info, which is fine for a threshold
+HEAP_SIZE_JS = '() => performance.memory ? performance.memory.usedJSHeapSize : 0'
+
+
+class BrowserPool:
+    """One warm page per worker, spread over long-lived browser contexts
+
+    Contexts keep their cookies (e.g. cleared challenges) and HTTP cache for
+    the daemon's lifetime; only pages are recycled. If Chromium goes away,
+    the next run relaunches it.
+    """
+
+    def __init__(self, playwright, size, contexts=1, blocker=None, max_navigations=DEFAULT_MAX_NAVIGATIONS,
+                 max_heap_bytes=DEFAULT_MAX_HEAP_MB * 1024 * 1024):
+        self.playwright = playwright
+        self.size = size
+        self.context_count = max(1, min(contexts, size))
+        self.blocker = blocker
+        self.max_navigations = max_navigations
+        self.max_heap_bytes = max_heap_bytes
+        self.browser = None
+        self.contexts = []
+        self.pages = []
+        self.navigations = {}
+        # Set when a page could not be replaced, e.g. its context died with Chromium still connected
+        self.broken = False
+        self.stats = Counter()
+
+    async def start(self):
+        self.browser, context = await launch_browser(self.playwright)
+        self.contexts = [context]
+        for _ in range(self.context_count - 1):
+            self.contexts.append(await self.browser.new_context(**CONTEXT_OPTIONS))
+        self.pages = [await new_crawler_page(self.contexts[slot % self.context_count], self.blocker)
+                      for slot in range(self.size)]
+        self.navigations = {}
+        self.broken = False
+        self.stats['launches'] += 1
+        logging.info(f"Browser pool ready: {self.size} pages in {self.context_count} contexts")
+
+    async def ready_pages(self):
+        """The pool's pages, relaunching Chromium first if it disconnected or a page could not be replaced"""
+        if self.browser is None or self.broken or not self.browser.is_connected():
+            if self.browser is not None:
+                logging.warning("Browser pool unusable, relaunching Chromium")
+                await self.close()
+            await self.start()
+        return list(self.pages)
+
+    async def after_navigation(self, crawler):
+        """Count a navigation on the crawler's page and swap in a fresh page when it is worn out"""
+        page = crawler.page
+        self.navigations[page] = self.navigations.get(page, 0) + 1
+        reason = None
+        if page.is_closed():
+            reason = 'closed'
+        elif self.navigations[page] >= self.max_navigations:
+            reason = 'navigations'
+        elif self.max_heap_bytes and await self.heap_size(page) > self.max_heap_bytes:
+            reason = 'heap'
+        if reason:
+            try:
+                crawler.page = await self.replace(page, reason)
+            except Exception:
+                self.broken = True
+                raise
+
+    @staticmethod
+    async def heap_size(page):
+        try:
+            return await page.evaluate(HEAP_SIZE_JS) or 0
+        except Exception:
+            return 0
+
+    async def replace(self, page, reason):
+        slot = self.pages.index(page)
+        self.navigations.pop(page, None)
+        try:
+            await page.close()
+        except Exception as e:
+            logging.warning(f"Failed to close recycled page: {str(e)}")
+        self.pages[slot] = await new_crawler_page(self.contexts[slot % self.context_count], self.blocker)
+        self.stats[f'recycled_{reason}'] += 1
+        logging.info(f"Recycled page {slot} ({reason})")
+        return self.pages[slot]
+
+    async def status(self):
+        heaps = [await self.heap_size(page) for page in self.pages if not page.is_closed()]
+        return {
+            'connected': bool(self.browser and self.browser.is_connected()),
+            'contexts': len(self.contexts),
+            'pages': len(self.pages),
+            'navigations': [self.navigations.get(page, 0) for page in self.pages],
+            'heap_mb': [round(heap / 1024 / 1024, 1) for heap in heaps],
+            **self.stats
+        }
+
+    async def close(self):
+        for context in self.contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        if self.browser:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        self.contexts = []
+        self.pages = []
+
+
+def profile_url(name):
+    """Accept a profile URL or a bare username"""
+    return name if name.startswith('http') else f"https://nitter.net/{name.lstrip('@')}"
+
+
+class CrawlDaemon:
+    """Runs run_crawl() on an interval and on request, keeping browser and shared state warm between runs"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL_MINUTES * 60, concurrency=DEFAULT_CONCURRENCY, fetch_mode='auto',
+                 block_resources=True, instances=DEFAULT_NITTER_INSTANCES, cache_dir=DEFAULT_CACHE_DIR,
+                 store_path=DEFAULT_STORE_PATH, metrics_file=NITTER_METRICS_FILE, contexts=1,
+                 max_navigations=DEFAULT_MAX_NAVIGATIONS, max_heap_bytes=DEFAULT_MAX_HEAP_MB * 1024 * 1024,
+                 allow_domains=(), deny_domains=()):
+        self.interval = interval
+        self.concurrency = max(1, min(concurrency, len(NITTER_URLS)))
+        self.fetch_mode = fetch_mode
+        self.block_resources = block_resources
+        self.allow_domains = list(allow_domains)
+        self.deny_domains = list(deny_domains)
+        self.instances = instances
+        self.cache_dir = cache_dir
+        self.store_path = store_path
+        self.metrics_file = metrics_file
+        self.contexts = contexts
+        self.max_navigations = max_navigations
+        self.max_heap_bytes = max_heap_bytes
+        self.requests = asyncio.Queue()
+        self.lock = asyncio.Lock()
+        self.started_at = datetime.now()
+        self.next_run = time.monotonic()
+        self.current = None
+        self.last_run = None
+        self.last_metrics = None
+        self.runs = 0
+
+    async def start(self, playwright):
+        """Set up everything that outlives a single run"""
+        os.makedirs('nitter_results', exist_ok=True)
+        self.rate_limiter = HostRateLimiter()
+        self.http_fetcher = await NitterHttpFetcher(limit=self.concurrency * 2).start() \
+            if self.fetch_mode == 'auto' else None
+        self.blocker = ResourceBlocker(block_types=NITTER_BLOCK_TYPES, deny_domains=TRACKER_DOMAINS + self.deny_domains,
+                                       allow_domains=self.allow_domains) if self.block_resources else None
+        self.state_store = CrawlStateStore(NITTER_STATE_FILE)
+        self.tweet_index = TweetIndex()
+        self.tweet_store = TweetStore(self.store_path) if self.store_path else None
+        # Runs always fetch live; pages are only written, for crawling offline with netter_crawler.py --replay
+        self.page_cache = PageCache(self.cache_dir, read=False) if self.cache_dir else None
+        self.instance_pool = NitterInstancePool(self.instances)
+        self.browser_pool = BrowserPool(playwright, self.concurrency, contexts=self.contexts, blocker=self.blocker,
+                                        max_navigations=self.max_navigations, max_heap_bytes=self.max_heap_bytes)
+        await self.browser_pool.start()
+
+    async def crawl(self, urls=None):
+        """One run over urls (default: every profile); runs never overlap"""
+        async with self.lock:
+            progress = {}
+            self.current = {'started_at': datetime.now().isoformat(), 'profiles': len(urls or NITTER_URLS),
+                            'progress': progress}
+            crawlers = []
+            for page in await self.browser_pool.ready_pages():
+                crawler = NitterCrawler(rate_limiter=self.rate_limiter, http_fetcher=self.http_fetcher,
+                                        state_store=self.state_store, pool=self.instance_pool,
+                                        tweet_index=self.tweet_index, page_cache=self.page_cache)
+                crawler.page = page
+                crawlers.append(crawler)
+            try:
+                # A full run that died part-way left its checkpoint behind; the next full run picks it up
+                summary = await run_crawl(crawlers, urls or NITTER_URLS,
+                                          resume=not urls and os.path.exists(NITTER_CHECKPOINT_FILE),
+                                          checkpoint_file=SUBSET_CHECKPOINT_FILE if urls else NITTER_CHECKPOINT_FILE,
+                                          tweet_store=self.tweet_store, blocker=self.blocker,
+                                          metrics_file=self.metrics_file,
+                                          dead_letter_file=None if urls else NITTER_DEAD_LETTER_FILE,
+                                          progress=progress, after_navigation=self.browser_pool.after_navigation)
+                self.last_metrics = summary['metrics']
+                self.last_run = {
+                    'finished_at': datetime.now().isoformat(),
+                    'results_file': summary['results_file'],
+                    'profiles': summary['total'],
+                    'failed': len(summary['failed_urls']),
+                    'wall_time': round(summary['wall_time'], 1)
+                }
+            except Exception as e:
+                logging.exception(f"Crawl run failed: {str(e)}")
+                self.last_run = {'finished_at': datetime.now().isoformat(), 'error': str(e)}
+            finally:
+                self.runs += 1
+                self.current = None
+
+    async def schedule(self):
+        """Scheduled full runs every interval seconds; requested runs in between"""
+        while True:
+            try:
+                urls = await asyncio.wait_for(self.requests.get(), max(0, self.next_run - time.monotonic()))
+            except asyncio.TimeoutError:
+                urls = None
+                self.next_run = time.monotonic() + self.interval
+            await self.crawl(urls)
+
+    async def handle_status(self, request):
+        return web.json_response({
+            'state': 'running' if self.current else 'idle',
+            'started_at': self.started_at.isoformat(),
+            'runs': self.runs,
+            'current': self.current,
+            'last_run': self.last_run,
+            'next_run_in': round(max(0, self.next_run - time.monotonic())),
+            'queued': self.requests.qsize(),
+            'browser': await self.browser_pool.status()
+        })
+
+    async def handle_crawl(self, request):
+        urls = None
+        if request.can_read_body:
+            try:
+                body = await request.json()
+            except ValueError:
+                raise web.HTTPBadRequest(text='expected {"urls": [...]}')
+            if not isinstance(body, dict):
+                raise web.HTTPBadRequest(text='expected {"urls": [...]}')
+            names = body.get('urls')
+            if names is None:
+                names = []
+            if not isinstance(names, list) or not all(isinstance(name, str) and name.strip() for name in names):
+                raise web.HTTPBadRequest(text='"urls" must be a list of usernames or profile URLs')
+            urls = [profile_url(name.strip()) for name in names] or None
+        self.requests.put_nowait(urls)
+        return web.json_response({'queued': True, 'profiles': len(urls or NITTER_URLS),
+                                  'position': self.requests.qsize() + bool(self.current)}, status=202)
+
+    async def handle_metrics(self, request):
+        if not self.last_metrics:
+            raise web.HTTPNotFound(text='no finished run yet')
+        return web.Response(text=self.last_metrics.prometheus(), content_type='text/plain', charset='utf-8')
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/status', self.handle_status)
+        app.router.add_post('/crawl', self.handle_crawl)
+        app.router.add_get('/metrics', self.handle_metrics)
+        return app
+
+    async def close(self):
+        await self.browser_pool.close()
+        if self.http_fetcher:
+            await self.http_fetcher.close()
+        self.tweet_index.close()
+        if self.tweet_store:
+            self.tweet_store.close()
+        if self.page_cache:
+            self.page_cache.close()
+
+
+async def serve(daemon, host='127.0.0.1', port=DEFAULT_PORT):
+    async with async_playwright() as playwright:
+        await daemon.start(playwright)
+        runner = web.AppRunner(daemon.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info(f"Control endpoint on http://{host}:{port} (GET /status, POST /crawl, GET /metrics)")
+        try:
+            await daemon.schedule()
+        finally:
+            await runner.cleanup()
+            await daemon.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL_MINUTES,
+                        help=f"minutes between scheduled runs (default: {DEFAULT_INTERVAL_MINUTES})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"number of warm pages crawling in parallel (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--contexts', type=int, default=1, help="browser contexts the pages are spread over")
+    parser.add_argument('--max-navigations', type=int, default=DEFAULT_MAX_NAVIGATIONS,
+                        help=f"recycle a page after this many navigations (default: {DEFAULT_MAX_NAVIGATIONS})")
+    parser.add_argument('--max-heap-mb', type=float, default=DEFAULT_MAX_HEAP_MB,
+                        help=f"recycle a page once its JS heap exceeds this, 0 disables (default: {DEFAULT_MAX_HEAP_MB})")
+    parser.add_argument('--fetch-mode', choices=['auto', 'browser'], default='auto',
+                        help="auto tries plain HTTP first and falls back to the browser (default: auto)")
+    parser.add_argument('--no-block', action='store_true',
+                        help="load images, media, fonts and stylesheets in the browser")
+    parser.add_argument('--allow-domains', default='',
+                        help="comma-separated domains never blocked, e.g. a CDN a page needs to render")
+    parser.add_argument('--deny-domains', default='',
+                        help="comma-separated domains always blocked, on top of the built-in trackers")
+    parser.add_argument('--instances', default=os.environ.get('NITTER_INSTANCES', ','.join(DEFAULT_NITTER_INSTANCES)),
+                        help="comma-separated Nitter base URLs (default: $NITTER_INSTANCES or https://nitter.net)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f"page cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not write fetched pages to the page cache (the daemon never reads it)")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH,
+                        help=f"SQLite tweet store the results are added to (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('--no-store', action='store_true', help="only write the JSON results files")
+    parser.add_argument('--metrics-file', default=NITTER_METRICS_FILE,
+                        help=f"Prometheus text file rewritten after every run (default: {NITTER_METRICS_FILE})")
+    parser.add_argument('--host', default='127.0.0.1', help="control endpoint address (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f"control endpoint port (default: {DEFAULT_PORT})")
+    args = parser.parse_args()
+    instances = [base_url.strip() for base_url in args.instances.split(',') if base_url.strip()]
+    if not instances:
+        parser.error("--instances (or $NITTER_INSTANCES) must list at least one Nitter base URL")
+
+    daemon = CrawlDaemon(interval=args.interval * 60, concurrency=args.concurrency, fetch_mode=args.fetch_mode,
+                         block_resources=not args.no_block, instances=instances,
+                         cache_dir=None if args.no_cache else args.cache_dir,
+                         store_path=None if args.no_store else args.store, metrics_file=args.metrics_file,
+                         contexts=args.contexts, max_navigations=args.max_navigations,
+                         max_heap_bytes=int(args.max_heap_mb * 1024 * 1024),
+                         allow_domains=split_domains(args.allow_domains), deny_domains=split_domains(args.deny_domains))
+    try:
+        asyncio.run(serve(daemon, args.host, args.port))
+    except KeyboardInterrupt:
+        logging.warning("Crawl daemon stopped")
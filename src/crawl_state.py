@@ -0,0 +1,63 @@
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from urllib.parse import urlparse
+
+STATUS_ID_RE = re.compile(r'/status/(\d+)')
+
+
+def tweet_id_from_url(url):
+    """Tweet ID from a nitter.net / twitter.com / x.com status link"""
+    match = STATUS_ID_RE.search(url or '')
+    return match.group(1) if match else None
+
+
+def profile_key(url):
+    """Profile key shared by Nitter and X URLs, e.g. https://x.com/Sama -> sama"""
+    return urlparse(url).path.strip('/').split('/')[0].lower()
+
+
+def is_seen(tweet_id, high_water):
+    """Tweet IDs are time-ordered, so anything at or below the high-water mark is old"""
+    return high_water is not None and tweet_id is not None and int(tweet_id) <= high_water
+
+
+class CrawlStateStore:
+    """Newest tweet seen per profile, persisted as a JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.profiles = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.profiles = json.load(f)
+            logging.info(f"Loaded crawl state for {len(self.profiles)} profiles from {path}")
+
+    def high_water(self, url):
+        """Newest tweet ID seen for the profile, or None"""
+        entry = self.profiles.get(profile_key(url))
+        return int(entry['tweet_id']) if entry else None
+
+    def update(self, url, tweets):
+        """Raise the profile's high-water mark to the newest crawled tweet"""
+        newest = None
+        for tweet in tweets:
+            tweet_id = tweet.get('id') or tweet_id_from_url(tweet.get('url'))
+            if tweet_id and (newest is None or int(tweet_id) > int(newest['id'])):
+                newest = {'id': tweet_id, 'timestamp': tweet.get('timestamp', '')}
+        if newest is None or is_seen(newest['id'], self.high_water(url)):
+            return
+        self.profiles[profile_key(url)] = {
+            'tweet_id': newest['id'],
+            'timestamp': newest['timestamp'],
+            'updated_at': datetime.now().isoformat()
+        }
+
+    def save(self):
+        """Write the state atomically so a crash never leaves a half-written file"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.profiles, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
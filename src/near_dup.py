@@ -0,0 +1,153 @@
+import re
+import zlib
+
+import numpy as np
+
+MAX_HASH = np.uint64((1 << 32) - 1)
+SHIFT = np.uint64(32)
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 32
+DEFAULT_THRESHOLD = 0.5
+CHUNK_TEXTS = 1024
+
+URL_RE = re.compile(r'https?://\S+')
+# One token per CJK character, one per latin word or number
+TOKEN_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]|[^\W_]+')
+
+
+def shingles(text, k=3):
+    """k-token shingles of a text, ignoring case, links and punctuation"""
+    tokens = TOKEN_RE.findall(URL_RE.sub(' ', text or '').lower())
+    if len(tokens) <= k:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+def permutations(num_perm=DEFAULT_NUM_PERM, seed=1):
+    """Random (a, b) pairs of the multiply-shift hash family ((a * x + b) mod 2**64) >> 32
+
+    Overflowing uint64 arithmetic does the mod 2**64 for free, which is about
+    twice as fast as the (a * x + b) mod (2**61 - 1) family.
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.randint(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(texts, num_perm=DEFAULT_NUM_PERM, seed=1):
+    """(len(texts), num_perm) MinHash matrix; texts without tokens get an all-MAX_HASH row
+
+    Shingle hashes are permuted as whole matrices, a chunk of texts at a
+    time, and reduced per text with np.minimum.reduceat.
+    """
+    a, b = permutations(num_perm, seed)
+    hashes = []
+    offsets = []
+    for text in texts:
+        offsets.append(len(hashes))
+        hashes.extend(zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text))
+    signatures = np.full((len(texts), num_perm), MAX_HASH, dtype=np.uint64)
+    if not hashes:
+        return signatures
+
+    # Permute in chunks of texts so the (num_perm, shingles) matrix stays small
+    values = np.array(hashes, dtype=np.uint64)
+    offsets = np.array(offsets + [len(hashes)])
+    for start in range(0, len(texts), CHUNK_TEXTS):
+        stop = min(start + CHUNK_TEXTS, len(texts))
+        lo, hi = offsets[start], offsets[stop]
+        if lo == hi:
+            continue
+        permuted = (a[:, None] * values[lo:hi] + b[:, None]) >> SHIFT
+        starts = offsets[start:stop]
+        nonempty = np.flatnonzero(offsets[start + 1:stop + 1] > starts)
+        signatures[start + nonempty] = np.minimum.reduceat(permuted, starts[nonempty] - lo, axis=1).T
+    return signatures
+
+
+def find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def duplicate_groups(texts, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, seed=1):
+    """Group indices of near-duplicate texts (estimated Jaccard >= threshold), singletons included
+
+    Candidate pairs come from LSH banding: texts whose signatures agree on
+    every row of at least one band. Candidates are then checked against the
+    full signature before being merged with union-find.
+    """
+    signatures = minhash_signatures(texts, num_perm, seed)
+    n = len(texts)
+    rows = num_perm // bands
+    empty = (signatures == MAX_HASH).all(axis=1)
+
+    # Fold each band's rows into one key; key collisions only add candidates
+    mix = permutations(rows, seed + 1)[0]
+    keys = (signatures[:, :bands * rows].reshape(n, bands, rows) * mix).sum(axis=2)
+    order = np.argsort(keys, axis=0, kind='stable')
+    sorted_keys = np.take_along_axis(keys, order, axis=0)
+    same = sorted_keys[1:] == sorted_keys[:-1]
+    first = order[:-1][same]
+    second = order[1:][same]
+
+    parent = list(range(n))
+    if n > 1:
+        pairs = np.unique(np.stack([first, second], axis=1), axis=0)
+        if len(pairs):
+            similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+            keep = (similarity >= threshold) & ~empty[pairs[:, 0]] & ~empty[pairs[:, 1]]
+            for i, j in pairs[keep].tolist():
+                root_i, root_j = find(parent, i), find(parent, j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(parent, i), []).append(i)
+    return list(groups.values())
+
+
+def total_engagement(item):
+    return sum((item.get('metrics') or {}).values())
+
+
+def collapse_tweets(tweets, score=total_engagement, threshold=DEFAULT_THRESHOLD):
+    """One tweet per near-duplicate group: the highest scoring one, with the group's metrics summed
+
+    The other copies' links are kept in the representative's 'duplicates' list.
+    """
+    tweets = list(tweets)
+    collapsed = []
+    for group in duplicate_groups([tweet.get('text', '') for tweet in tweets], threshold):
+        members = [tweets[i] for i in group]
+        if len(members) == 1:
+            collapsed.append(members[0])
+            continue
+        best = max(members, key=score)
+        metrics = {}
+        for member in members:
+            for name, value in (member.get('metrics') or {}).items():
+                metrics[name] = metrics.get(name, 0) + value
+        collapsed.append({
+            **best,
+            'metrics': metrics,
+            'duplicates': [member.get('url', '') for member in members if member is not best]
+        })
+    return collapsed
+
+
+def collapse_articles(articles, threshold=DEFAULT_THRESHOLD):
+    """One article per group of near-identical titles, the first seen, listing the others' links"""
+    articles = list(articles)
+    collapsed = []
+    for group in duplicate_groups([article.get('title', '') for article in articles], threshold):
+        first = articles[group[0]]
+        if len(group) > 1:
+            first = {**first, 'duplicates': [articles[i]['url'] for i in group[1:]]}
+        collapsed.append(first)
+    return collapsed
@@ -1,11 +1,27 @@
 import asyncio
 from playwright.async_api import async_playwright, TimeoutError
-import json
+import aiohttp
+from selectolax.lexbor import LexborHTMLParser
 from datetime import datetime
 import logging
 import random
 import os
+import time
+import argparse
+import re
+from urllib.parse import urlparse
 from twitter_urls import TWITTER_URLS
+from rate_limiter import HostRateLimiter, parse_retry_after
+from resource_blocker import ResourceBlocker, NITTER_BLOCK_TYPES, TRACKER_DOMAINS, split_domains
+from crawl_state import CrawlStateStore, tweet_id_from_url, is_seen
+from tweet_index import TweetIndex
+from tweet_store import TweetStore, DEFAULT_STORE_PATH
+from page_cache import PageCache, CacheMissError, DEFAULT_CACHE_DIR
+from run_metrics import RunMetrics
+from result_writer import JsonlCheckpoint, read_checkpoint, consolidate, write_failed_urls
+from nitter_pool import NitterInstancePool, DEFAULT_NITTER_INSTANCES
+from retry_scheduler import (RetryScheduler, ChallengeError, RedirectError, ExtractionError, failed_result,
+                             load_dead_letters, write_dead_letters, order_with_dead_letters)
 
 # Transform Twitter URLs to Nitter URLs
 NITTER_URLS = [url.replace('twitter.com', 'nitter.net').replace('x.com', 'nitter.net') for url in TWITTER_URLS]
@@ -19,309 +35,771 @@ logging.basicConfig(
     ]
 )
 
+# Any of these means the profile page has rendered (timeline, empty timeline or error panel)
+READY_SELECTOR = '.timeline-item, .profile-card-username, .timeline-none, .error-panel'
+# Structural markers of a Cloudflare/anti-bot interstitial
+CHALLENGE_SELECTOR = ('#challenge-form, #challenge-stage, #cf-challenge-running, '
+                      '.cf-browser-verification, iframe[src*="challenges.cloudflare.com"]')
+READY_TIMEOUT = 20000
+CHALLENGE_TIMEOUT = 15000
+
+PAGE_STATE_JS = '''([ready, challenge]) => {
+    if (document.querySelector(challenge)) return 'challenge';
+    return document.querySelector(ready) ? 'ready' : 'loading';
+}'''
+
+# Collects the profile username and every timeline item in a single page.evaluate call
+TIMELINE_EXTRACT_JS = '''() => {
+    const text = (el) => el ? el.innerText : '';
+    const card = document.querySelector('.profile-card-username');
+    const items = Array.from(document.querySelectorAll('.timeline-item')).map((item) => {
+        const link = item.querySelector('.tweet-link');
+        const date = item.querySelector('.tweet-date a');
+        const author = item.querySelector('.tweet-header .username');
+        const stats = {};
+        item.querySelectorAll('.tweet-stats .tweet-stat').forEach((stat) => {
+            const icon = stat.querySelector('span[class^="icon-"]');
+            const match = icon && icon.className.match(/icon-([\\w-]+)/);
+            if (match) stats[match[1]] = text(stat);
+        });
+        return {
+            username: text(author),
+            href: link ? link.getAttribute('href') : '',
+            text: text(item.querySelector('.tweet-content')),
+            date_title: date ? date.getAttribute('title') : '',
+            is_retweet: !!item.querySelector('.retweet-header'),
+            pinned: !!item.querySelector('.pinned'),
+            stats: stats
+        };
+    });
+    return {username: text(card), items: items};
+}'''
+
+# Nitter stat icon name -> metrics key
+STAT_ICONS = {'comment': 'reply', 'retweet': 'retweet', 'heart': 'like'}
+
+def parse_stat_count(text):
+    """Parse a Nitter stat like ' 1,234' into an int"""
+    digits = ''.join(filter(str.isdigit, text or ''))
+    return int(digits) if digits else 0
+
+def parse_timeline_payload(payload, max_items=4, high_water=None):
+    """Turn an extracted timeline payload into (username, tweets newer than high_water)"""
+    tweets = []
+    items = payload.get('items') or []
+    
+    if not items:
+        logging.warning("No tweets found on the page")
+    
+    for item in items[:max_items]:  # Get first 4 tweets
+        # Check if it's a retweet
+        if item.get('is_retweet'):
+            logging.info("Skipping retweet")
+            continue
+        
+        tweet_url = item.get('href') or ""
+        if tweet_url:
+            # Canonical nitter.net link, whichever instance served the page
+            tweet_url = f"https://nitter.net{tweet_url}"
+        
+        # Stop at the first already-seen tweet; pinned tweets are out of order
+        tweet_id = tweet_id_from_url(tweet_url)
+        if is_seen(tweet_id, high_water):
+            if item.get('pinned'):
+                continue
+            break
+        
+        metrics = {}
+        for icon, count_text in (item.get('stats') or {}).items():
+            if icon in STAT_ICONS:
+                metrics[STAT_ICONS[icon]] = parse_stat_count(count_text)
+        
+        tweets.append({
+            'id': tweet_id,
+            'text': item.get('text') or "",
+            'timestamp': item.get('date_title') or "",
+            'url': tweet_url,
+            'metrics': metrics
+        })
+    
+    return payload.get('username') or "", tweets
+
+def node_text(node):
+    """Approximate innerText for a selectolax node"""
+    if node is None:
+        return ""
+    return node.text(deep=True, separator='', strip=False).strip()
+
+def page_state(tree):
+    """Same states as PAGE_STATE_JS, for HTML fetched without a browser"""
+    if tree.css_first(CHALLENGE_SELECTOR):
+        return 'challenge'
+    return 'ready' if tree.css_first(READY_SELECTOR) else 'loading'
+
+def extract_timeline_payload(tree):
+    """Build the TIMELINE_EXTRACT_JS payload from parsed HTML"""
+    items = []
+    for item in tree.css('.timeline-item'):
+        link = item.css_first('.tweet-link')
+        date = item.css_first('.tweet-date a')
+        stats = {}
+        for stat in item.css('.tweet-stats .tweet-stat'):
+            icon = stat.css_first('span[class^="icon-"]')
+            match = icon and re.search(r'icon-([\w-]+)', icon.attributes.get('class') or '')
+            if match:
+                stats[match.group(1)] = node_text(stat)
+        items.append({
+            'username': node_text(item.css_first('.tweet-header .username')),
+            'href': link.attributes.get('href') or '' if link else '',
+            'text': node_text(item.css_first('.tweet-content')),
+            'date_title': date.attributes.get('title') or '' if date else '',
+            'is_retweet': item.css_first('.retweet-header') is not None,
+            'pinned': item.css_first('.pinned') is not None,
+            'stats': stats
+        })
+    return {'username': node_text(tree.css_first('.profile-card-username')), 'items': items}
+
+class NitterHttpFetcher:
+    """Fetch server-rendered Nitter pages over a pooled keep-alive HTTP session"""
+    
+    def __init__(self, limit=10):
+        self.limit = limit
+        self.session = None
+    
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=HTTP_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=20),
+            auto_decompress=True  # aiohttp negotiates gzip/deflate (and br if brotli is installed)
+        )
+        return self
+    
+    async def close(self):
+        if self.session:
+            await self.session.close()
+    
+    async def fetch(self, url):
+        """Return (status, final url, headers, html)"""
+        async with self.session.get(url, allow_redirects=True) as response:
+            html = await response.text(errors='replace')
+            return response.status, str(response.url), response.headers, html
+
+def same_host(url, other):
+    return urlparse(url).hostname == urlparse(other).hostname
+
 class NitterCrawler:
-    def __init__(self):
+    def __init__(self, rate_limiter=None, http_fetcher=None, state_store=None, pool=None, max_attempts=3,
+                 tweet_index=None, page_cache=None, run_metrics=None):
         self.context = None
         self.page = None
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        # Nitter mirrors to spread requests over; a profile fails over up to max_attempts instances
+        self.pool = pool or NitterInstancePool()
+        self.max_attempts = max_attempts
+        # When set, profiles are fetched over plain HTTP first
+        self.http_fetcher = http_fetcher
+        # Profiles served by each fetch path
+        self.stats = {'fast_path': 0, 'browser': 0}
+        # Per-profile high-water marks for incremental crawling
+        self.state_store = state_store
+        # Cross-run index of crawled tweet IDs, shared with the X crawler
+        self.tweet_index = tweet_index
+        # Fetched profile pages; in replay mode the only source of pages
+        self.page_cache = page_cache
+        # Seconds each profile spent waiting for the page to become ready
+        self.wait_times = {}
+        # Stage timings and counters, shared by every worker of a run
+        self.run_metrics = run_metrics or RunMetrics('nitter')
     
     async def random_delay(self, min_seconds=1, max_seconds=3):
         """Random delay to simulate human behavior"""
         delay = random.uniform(min_seconds, max_seconds)
-        await asyncio.sleep(delay)
+        with self.run_metrics.stage('sleep'):
+            await asyncio.sleep(delay)
 
-    async def wait_for_page_load(self):
-        """Wait for the page to be fully loaded"""
+    async def wait_for_page_load(self, url=None):
+        """Wait until the timeline or profile card is rendered, return seconds waited"""
+        started = time.monotonic()
         try:
-            # First check if we're being challenged
-            content = await self.page.content()
-            if "challenge" in content.lower() or "cloudflare" in content.lower():
-                logging.info("Detected Cloudflare challenge, waiting for it to resolve...")
-                await asyncio.sleep(15)  # Wait for challenge to resolve
+            # Return as soon as content or a challenge interstitial is attached
+            await self.page.wait_for_selector(f"{READY_SELECTOR}, {CHALLENGE_SELECTOR}",
+                                              state='attached', timeout=READY_TIMEOUT)
+            state = await self.page.evaluate(PAGE_STATE_JS, [READY_SELECTOR, CHALLENGE_SELECTOR])
             
-            # Wait for network to be idle
-            await self.page.wait_for_load_state('networkidle', timeout=30000)
-            # Wait for DOM to be ready
-            await self.page.wait_for_load_state('domcontentloaded', timeout=30000)
-            # Wait for JavaScript to be ready
-            await self.page.wait_for_load_state('load', timeout=30000)
-            
-            # Additional wait for dynamic content
-            await asyncio.sleep(5)
-            
-            # Check if page is actually loaded
-            content = await self.page.content()
-            if len(content) < 100:  # If content is too short
-                logging.warning("Page content seems too short, waiting longer...")
-                await asyncio.sleep(10)  # Wait longer
-                
-                # Try to evaluate JavaScript to check if page is loaded
-                is_loaded = await self.page.evaluate('''() => {
-                    return document.readyState === 'complete' && 
-                           document.body && 
-                           document.body.innerHTML.length > 0;
-                }''')
-                
-                if not is_loaded:
-                    # Try to reload the page
-                    logging.info("Attempting to reload the page...")
-                    await self.page.reload(wait_until='networkidle', timeout=30000)
-                    await asyncio.sleep(5)
-                    
-                    # Check again after reload
-                    content = await self.page.content()
-                    if len(content) < 100:
-                        raise Exception("Page failed to load properly even after reload")
+            if state == 'challenge':
+                logging.info("Detected challenge interstitial, waiting for it to resolve...")
+                self.rate_limiter.record(self.page.url, challenged=True)
+                self.run_metrics.inc('challenges_total')
+                try:
+                    await self.page.wait_for_selector(READY_SELECTOR, state='attached',
+                                                      timeout=CHALLENGE_TIMEOUT)
+                except TimeoutError:
+                    raise ChallengeError(f"Challenge did not resolve within {CHALLENGE_TIMEOUT / 1000:.0f}s")
                 
         except Exception as e:
             logging.warning(f"Page load warning: {str(e)}")
             raise  # Re-raise the exception to handle it in the calling function
+        finally:
+            elapsed = time.monotonic() - started
+            self.wait_times[url or self.page.url] = elapsed
+        
+        logging.info(f"Page ready after {elapsed:.2f}s")
+        return elapsed
 
     async def crawl_profile(self, url):
-        """Crawl a specific profile from nitter.net"""
-        max_retries = 3
-        for retry in range(max_retries):
-            try:
-                logging.info(f"Starting to crawl: {url} (Attempt {retry + 1}/{max_retries})")
-                
-                # Visit the page
-                try:
-                    logging.info(f"Attempting to navigate to: {url}")
-                    response = await self.page.goto(url, wait_until='networkidle', timeout=30000)
-                    logging.info(f"Page response status: {response.status if response else 'No response'}")
-                    
-                    await self.random_delay(3, 5)
-                    await self.wait_for_page_load()
-                    
-                    # Check if we're blocked or redirected
-                    current_url = self.page.url
-                    if 'nitter.net' not in current_url:
-                        raise Exception(f"Redirected to unexpected URL: {current_url}")
-                    
-                except Exception as e:
-                    logging.error(f"Page navigation error: {str(e)}")
-                    return {
-                        'url': url,
-                        'timestamp': datetime.now().isoformat(),
-                        'error': str(e),
-                        'success': False
-                    }
-                
-                # Extract profile data
-                try:
-                    # Get username
-                    username_element = await self.page.query_selector('.profile-card-username')
-                    username = await username_element.inner_text() if username_element else ""
-                    
-                    # Get tweets
-                    tweets = []
-                    tweet_elements = await self.page.query_selector_all('.timeline-item')
-                    
-                    if not tweet_elements:
-                        logging.warning("No tweets found on the page")
-                    
-                    for tweet in tweet_elements[:4]:  # Get first 4 tweets
-                        try:
-                            # Check if it's a retweet
-                            retweet_header = await tweet.query_selector('.retweet-header')
-                            if retweet_header:
-                                logging.info("Skipping retweet")
-                                continue
-                            
-                            # Get tweet link
-                            tweet_link = await tweet.query_selector('.tweet-link')
-                            tweet_url = await tweet_link.get_attribute('href') if tweet_link else ""
-                            if tweet_url:
-                                tweet_url = f"https://nitter.net{tweet_url}"
-                            
-                            # Get tweet content
-                            tweet_content = await tweet.query_selector('.tweet-content')
-                            text = await tweet_content.inner_text() if tweet_content else ""
-                            
-                            # Get tweet time
-                            time_element = await tweet.query_selector('.tweet-date a')
-                            timestamp = await time_element.get_attribute('title') if time_element else ""
-                            
-                            # Get tweet stats
-                            metrics = {}
-                            stats_container = await tweet.query_selector('.tweet-stats')
-                            if stats_container:
-                                # Get replies
-                                reply_stat = await stats_container.query_selector('.tweet-stat:has(.icon-comment)')
-                                if reply_stat:
-                                    reply_text = await reply_stat.inner_text()
-                                    metrics['reply'] = int(''.join(filter(str.isdigit, reply_text))) if reply_text else 0
-                                
-                                # Get retweets
-                                retweet_stat = await stats_container.query_selector('.tweet-stat:has(.icon-retweet)')
-                                if retweet_stat:
-                                    retweet_text = await retweet_stat.inner_text()
-                                    metrics['retweet'] = int(''.join(filter(str.isdigit, retweet_text))) if retweet_text else 0
-                                
-                                # Get likes
-                                like_stat = await stats_container.query_selector('.tweet-stat:has(.icon-heart)')
-                                if like_stat:
-                                    like_text = await like_stat.inner_text()
-                                    metrics['like'] = int(''.join(filter(str.isdigit, like_text))) if like_text else 0
-                            
-                            tweet_data = {
-                                'text': text,
-                                'timestamp': timestamp,
-                                'url': tweet_url,
-                                'metrics': metrics
-                            }
-                            
-                            tweets.append(tweet_data)
-                            
-                        except Exception as e:
-                            logging.error(f"Error extracting tweet data: {str(e)}")
-                            continue
-                    
-                    result = {
-                        'url': url,
-                        'username': username,
-                        'timestamp': datetime.now().isoformat(),
-                        'tweets': tweets,
-                        'success': True
-                    }
-                    
-                    logging.info(f"Successfully crawled {url}: found {len(tweets)} tweets")
-                    return result
-                    
-                except Exception as e:
-                    logging.error(f"Error extracting profile data: {str(e)}")
-                    return {
-                        'url': url,
-                        'timestamp': datetime.now().isoformat(),
-                        'error': str(e),
-                        'success': False
-                    }
-                
-            except Exception as e:
-                logging.error(f"Error crawling {url}: {str(e)}")
-                return {
-                    'url': url,
-                    'timestamp': datetime.now().isoformat(),
-                    'error': str(e),
-                    'success': False
-                }
-
-async def main():
-    # List of URLs to crawl
-    async with async_playwright() as playwright:
-        # Launch headless browser
-        logging.info("Launching headless browser...")
-        browser = await playwright.chromium.launch(
-            headless=True,  # Use headless mode
-            args=[
-                '--disable-blink-features=AutomationControlled',
-                '--disable-dev-shm-usage',
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-gpu',
-                '--disable-software-rasterizer',
-                '--disable-web-security',
-                '--disable-features=IsolateOrigins,site-per-process',
-                '--disable-site-isolation-trials',
-                '--disable-features=BlockInsecurePrivateNetworkRequests',
-                '--disable-features=CrossOriginOpenerPolicy',
-                '--disable-features=CrossOriginEmbedderPolicy'
-            ]
-        )
+        """Crawl a profile from the page cache or live, then apply the incremental state"""
+        with self.run_metrics.stage('profile'):
+            result = self.crawl_profile_cached(url) if self.page_cache else None
+            if not result:
+                result = await self.crawl_profile_failover(url)
         
-        # Create a new context with realistic browser settings
-        context = await browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-            locale='en-US',
-            timezone_id='America/New_York',
-            geolocation={'latitude': 40.7128, 'longitude': -74.0060},
-            permissions=['geolocation'],
-            bypass_csp=True,
-            java_script_enabled=True,
-            has_touch=True,
-            is_mobile=False,
-            color_scheme='light',
-            reduced_motion='no-preference',
-            forced_colors='none'
-        )
+        if result['success'] and self.state_store:
+            self.state_store.update(url, result['tweets'])
+        if result['success'] and self.tweet_index:
+            result['tweets'] = self.tweet_index.filter_new(result['tweets'])
+        if result['success']:
+            self.run_metrics.inc('tweets_total', len(result['tweets']))
+        return result
+
+    async def crawl_profile_failover(self, url):
+        """Crawl a profile, failing over across Nitter instances"""
+        tried = set()
+        result = None
+        for attempt in range(min(self.max_attempts, len(self.pool.instances))):
+            instance = self.pool.pick(exclude=tried)
+            if not instance:
+                break
+            tried.add(instance.base_url)
+            fetch_url = self.pool.url_for(instance, url)
+            
+            self.pool.start(instance)
+            started = time.monotonic()
+            result = await self.crawl_profile_on(url, fetch_url)
+            if result['success']:
+                self.pool.record_success(instance, time.monotonic() - started)
+                break
+            self.pool.record_failure(instance, result['error'])
+            logging.warning(f"Failed on {instance.base_url} (attempt {attempt + 1}): {result['error']}")
+        return result
+
+    async def crawl_profile_on(self, url, fetch_url):
+        """Crawl url from one instance, over HTTP when possible"""
+        result = None
+        if self.http_fetcher:
+            result = await self.crawl_profile_http(url, fetch_url)
+            if result and result['success']:
+                self.stats['fast_path'] += 1
         
-        # Create a new page
-        page = await context.new_page()
+        if not result:
+            self.stats['browser'] += 1
+            result = await self.crawl_profile_browser(url, fetch_url)
+        return result
+
+    def crawl_profile_cached(self, url):
+        """Parse a profile from the page cache, None on a miss (a failure in replay mode)"""
+        with self.run_metrics.stage('cache_lookup'):
+            html = self.page_cache.get_text(url, 'nitter')
+        if html is None:
+            if self.page_cache.replay:
+                return failed_result(url, CacheMissError(f"No cached page for {url}"))
+            return None
+        with self.run_metrics.stage('parse'):
+            tree = LexborHTMLParser(html)
+        with self.run_metrics.stage('extract'):
+            result = self.result_from_tree(url, tree)
+        if result:
+            self.run_metrics.inc('pages_total', path='cache')
+            logging.info(f"Served {url} from the page cache: found {len(result['tweets'])} new tweets")
+        elif self.page_cache.replay:
+            return failed_result(url, ExtractionError(f"Cached page for {url} has no timeline"))
+        return result
+
+    def result_from_tree(self, url, tree):
+        """Result for a parsed profile page, None if it has no timeline items"""
+        payload = extract_timeline_payload(tree)
+        if not payload['items']:
+            return None
+        username, tweets = parse_timeline_payload(payload, high_water=self.high_water(url))
+        return {
+            'url': url,
+            'username': username,
+            'timestamp': datetime.now().isoformat(),
+            'tweets': tweets,
+            'success': True
+        }
+
+    def high_water(self, url):
+        return self.state_store.high_water(url) if self.state_store else None
+
+    async def crawl_profile_http(self, url, fetch_url=None):
+        """Fetch and parse a profile without a browser, None means use the browser"""
+        fetch_url = fetch_url or url
+        try:
+            with self.run_metrics.stage('rate_limit_wait'):
+                await self.rate_limiter.acquire(fetch_url)
+            with self.run_metrics.stage('http_fetch'):
+                status, final_url, headers, html = await self.http_fetcher.fetch(fetch_url)
+        except Exception as e:
+            # A reset or timeout may be transient; the browser gets its own try
+            logging.warning(f"HTTP fetch failed for {fetch_url}, falling back to browser: {str(e)}")
+            return None
+        self.run_metrics.inc('bytes_total', len(html.encode('utf-8')), path='http')
         
-        # Set extra HTTP headers
-        await page.set_extra_http_headers({
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0',
-            'sec-ch-ua': '"Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"macOS"',
-            'DNT': '1',
-            'Referer': 'https://www.google.com/'
-        })
+        with self.run_metrics.stage('parse'):
+            tree = LexborHTMLParser(html)
+            state = page_state(tree)
+        self.rate_limiter.record(fetch_url, status, challenged=state == 'challenge',
+                                 retry_after=parse_retry_after(headers.get('Retry-After')))
+        if state == 'challenge':
+            self.run_metrics.inc('challenges_total')
         
-        crawler = NitterCrawler()
-        crawler.page = page
+        if status != 200 or not same_host(final_url, fetch_url) or state != 'ready':
+            logging.info(f"HTTP fast path unusable for {fetch_url} (status={status}, state={state}), falling back to browser")
+            return None
         
-        results = []
-        failed_urls = []
+        with self.run_metrics.stage('extract'):
+            result = self.result_from_tree(url, tree)
+        if not result:
+            logging.info(f"Empty timeline over HTTP for {fetch_url}, falling back to browser")
+            return None
         
-        # Create results directory if it doesn't exist
-        os.makedirs('nitter_results', exist_ok=True)
+        self.run_metrics.inc('pages_total', path='http')
+        if self.page_cache:
+            with self.run_metrics.stage('cache_store'):
+                self.page_cache.put(url, 'nitter', html, status)
+        logging.info(f"Successfully crawled {fetch_url} over HTTP: found {len(result['tweets'])} new tweets")
+        return result
+
+    async def crawl_profile_browser(self, url, fetch_url=None):
+        """Crawl a specific profile from a Nitter instance in the browser"""
+        fetch_url = fetch_url or url
+        logging.info(f"Starting to crawl: {fetch_url}")
         
+        # Visit the page
         try:
-            for i, url in enumerate(NITTER_URLS):
-                logging.info(f"Processing {url} ({i+1}/{len(NITTER_URLS)})")
-                
-                # Add delay to avoid rate limiting
-                if i > 0:
-                    await asyncio.sleep(5)
-                
-                result = await crawler.crawl_profile(url)
-                results.append(result)
-                
-                if not result['success']:
-                    failed_urls.append(url)
-                
-                # Save intermediate results
-                if (i + 1) % 5 == 0:
-                    with open('nitter_results/nitter_results_temp.json', 'w', encoding='utf-8') as f:
-                        json.dump(results, f, ensure_ascii=False, indent=2)
-                    logging.info("Saved intermediate results to nitter_results/nitter_results_temp.json")
+            with self.run_metrics.stage('rate_limit_wait'):
+                await self.rate_limiter.acquire(fetch_url)
+            logging.info(f"Attempting to navigate to: {fetch_url}")
+            with self.run_metrics.stage('goto'):
+                response = await self.page.goto(fetch_url, wait_until='domcontentloaded', timeout=30000)
+            logging.info(f"Page response status: {response.status if response else 'No response'}")
+            if response:
+                self.rate_limiter.record(fetch_url, response.status,
+                                         retry_after=parse_retry_after(response.headers.get('retry-after')))
+            
+            with self.run_metrics.stage('wait_for_page_load'):
+                await self.wait_for_page_load(url)
+            
+            # Check if we're blocked or redirected
+            current_url = self.page.url
+            if not same_host(current_url, fetch_url):
+                raise RedirectError(f"Redirected to unexpected URL: {current_url}")
             
-            # Save final results
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            final_filename = f'nitter_results/nitter_results_{timestamp}.json'
-            with open(final_filename, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logging.error(f"Page navigation error: {str(e)}")
+            return failed_result(url, e)
+        
+        # Extract profile data
+        try:
+            # One round trip returns every timeline item
+            with self.run_metrics.stage('extract'):
+                payload = await self.page.evaluate(TIMELINE_EXTRACT_JS)
+                username, tweets = parse_timeline_payload(payload, high_water=self.high_water(url))
             
-            # Save failed URLs
-            if failed_urls:
-                failed_filename = f'nitter_results/failed_urls_{timestamp}.txt'
-                with open(failed_filename, 'w', encoding='utf-8') as f:
-                    for url in failed_urls:
-                        f.write(f"{url}\n")
-                logging.warning(f"Failed to crawl {len(failed_urls)} URLs. See {failed_filename} for details")
+            result = {
+                'url': url,
+                'username': username,
+                'timestamp': datetime.now().isoformat(),
+                'tweets': tweets,
+                'success': True
+            }
             
-            logging.info(f"Crawling completed! Final results saved to {final_filename}")
-            logging.info(f"Successfully crawled: {len(results) - len(failed_urls)} URLs")
-            logging.info(f"Failed to crawl: {len(failed_urls)} URLs")
+            self.run_metrics.inc('pages_total', path='browser')
+            if self.page_cache:
+                with self.run_metrics.stage('cache_store'):
+                    self.page_cache.put(url, 'nitter', await self.page.content())
+            logging.info(f"Successfully crawled {fetch_url}: found {len(tweets)} new tweets")
+            return result
             
+        except Exception as e:
+            logging.error(f"Error extracting profile data: {str(e)}")
+            return failed_result(url, ExtractionError(str(e)))
+
+# Newest tweet seen per profile, used for incremental crawls
+NITTER_STATE_FILE = 'nitter_results/crawl_state.json'
+
+# Results are streamed here as each profile finishes
+NITTER_CHECKPOINT_FILE = 'nitter_results/nitter_results_checkpoint.jsonl'
+
+# Profiles that exhausted their retries; the next run crawls these first
+NITTER_DEAD_LETTER_FILE = 'nitter_results/dead_letter.jsonl'
+
+# Prometheus text file rewritten at the end of every run; the JSON run summary goes next to the results
+NITTER_METRICS_FILE = 'nitter_results/metrics.prom'
+
+# Default number of pages crawling profiles in parallel
+DEFAULT_CONCURRENCY = 3
+
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-gpu',
+    '--disable-software-rasterizer',
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process',
+    '--disable-site-isolation-trials',
+    '--disable-features=BlockInsecurePrivateNetworkRequests',
+    '--disable-features=CrossOriginOpenerPolicy',
+    '--disable-features=CrossOriginEmbedderPolicy'
+]
+
+EXTRA_HTTP_HEADERS = {
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0',
+    'sec-ch-ua': '"Chromium";v="122", "Not(A:Brand";v="24", "Google Chrome";v="122"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"macOS"',
+    'DNT': '1',
+    'Referer': 'https://www.google.com/'
+}
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+
+# Realistic browser context settings
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': USER_AGENT,
+    'locale': 'en-US',
+    'timezone_id': 'America/New_York',
+    'geolocation': {'latitude': 40.7128, 'longitude': -74.0060},
+    'permissions': ['geolocation'],
+    'bypass_csp': True,
+    'java_script_enabled': True,
+    'has_touch': True,
+    'is_mobile': False,
+    'color_scheme': 'light',
+    'reduced_motion': 'no-preference',
+    'forced_colors': 'none'
+}
+
+# Headers for the HTTP fast path; aiohttp sets Accept-Encoding itself
+HTTP_HEADERS = {key: value for key, value in EXTRA_HTTP_HEADERS.items() if key != 'Accept-Encoding'}
+HTTP_HEADERS['User-Agent'] = USER_AGENT
+
+async def new_crawler_page(context, blocker=None):
+    """Create a page with the crawler's extra HTTP headers and resource blocking"""
+    page = await context.new_page()
+    await page.set_extra_http_headers(EXTRA_HTTP_HEADERS)
+    if blocker:
+        await blocker.install(page)
+    return page
+
+async def crawl_worker(worker_id, crawler, scheduler, total, checkpoint, progress, after_navigation=None):
+    """Pull profiles from the retry scheduler until the run is finished
+
+    after_navigation(crawler), when given, is awaited after every profile
+    that used the crawler's browser page, e.g. to recycle the page. If it
+    raises, the page is unusable: the profile is recorded if it succeeded
+    or handed back to the queue otherwise, and the worker stops.
+    """
+    while True:
+        item = await scheduler.get()
+        if item is None:
+            return
+        index, url = item
+        logging.info(f"[worker {worker_id}] Processing {url} ({index+1}/{total})")
+        
+        navigations = crawler.stats['browser']
+        try:
+            result = await crawler.crawl_profile(url)
+        except Exception as e:
+            result = failed_result(url, e)
+        if not result['success']:
+            crawler.run_metrics.error(result['error_type'])
+        if after_navigation and crawler.stats['browser'] > navigations:
+            try:
+                await after_navigation(crawler)
+            except Exception as e:
+                logging.error(f"[worker {worker_id}] Lost its browser page, stopping: {str(e)}")
+                if not result['success']:
+                    await scheduler.requeue(item)
+                elif await scheduler.done(item, result):
+                    checkpoint.append(result)
+                    progress['done'] += 1
+                return
+        
+        # Stream each final result to the checkpoint as soon as it is done
+        if await scheduler.done(item, result):
+            checkpoint.append(result)
+            progress['done'] += 1
+
+async def launch_browser(playwright):
+    """Launch headless Chromium with a realistic browser context"""
+    logging.info("Launching headless browser...")
+    browser = await playwright.chromium.launch(
+        headless=True,  # Use headless mode
+        args=BROWSER_ARGS
+    )
+    
+    # Create a new context with realistic browser settings
+    context = await browser.new_context(**CONTEXT_OPTIONS)
+    return browser, context
+
+async def run_crawl(crawlers, urls=NITTER_URLS, resume=False, deadline=None, replay=False, tweet_store=None,
+                    blocker=None, metrics_file=NITTER_METRICS_FILE, dead_letter_file=NITTER_DEAD_LETTER_FILE,
+                    progress=None, after_navigation=None, checkpoint_file=NITTER_CHECKPOINT_FILE):
+    """Crawl urls once with ready crawlers, then write the results and the run report
+
+    The crawlers' shared state store, tweet index, page cache, instance pool
+    and rate limiter are used as they are, so a caller can keep them (and the
+    browser) alive across runs. Runs over different profile lists need their
+    own checkpoint_file. Returns the consolidation summary with the results
+    file and wall time added.
+    """
+    state_store = crawlers[0].state_store
+    tweet_index = crawlers[0].tweet_index
+    incremental = state_store is not None
+    run_metrics = RunMetrics('nitter')
+    for crawler in crawlers:
+        crawler.run_metrics = run_metrics
+    
+    # On resume, skip profiles that already succeeded and replay their high-water marks
+    done_urls = set()
+    if resume:
+        for record in read_checkpoint(checkpoint_file):
+            if record.get('success'):
+                done_urls.add(record['url'])
+                if state_store:
+                    state_store.update(record['url'], record.get('tweets', []))
+                if tweet_index:
+                    tweet_index.filter_new(record.get('tweets', []))
+        logging.info(f"Resuming: {len(done_urls)} profiles already crawled")
+    checkpoint = JsonlCheckpoint(checkpoint_file, resume=resume)
+    
+    # Profiles that exhausted their retries last run go first
+    dead_urls = load_dead_letters(dead_letter_file) if dead_letter_file else []
+    if dead_urls:
+        logging.info(f"Retrying {len(dead_urls)} dead-lettered profiles first")
+    pending = [item for item in order_with_dead_letters(urls, dead_urls) if item[1] not in done_urls]
+    if progress is None:
+        progress = {}
+    progress.update(done=0, total=len(pending))
+    scheduler = RetryScheduler(pending, deadline=deadline)
+    
+    try:
+        logging.info(f"Crawling {len(pending)} profiles with {len(crawlers)} workers")
+        started = time.monotonic()
+        
+        workers = [
+            asyncio.create_task(crawl_worker(worker_id, crawler, scheduler, len(urls), checkpoint, progress,
+                                             after_navigation))
+            for worker_id, crawler in enumerate(crawlers)
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            # Never leave workers writing to a checkpoint that is about to be closed
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        
+        wall_time = time.monotonic() - started
+        if scheduler.expired():
+            scheduler.finish()
+        else:
+            scheduler.finish('every worker lost its browser page')
+        checkpoint.close()
+        if dead_letter_file and not replay:
+            write_dead_letters(dead_letter_file, scheduler.dead)
+        
+        # Stream the checkpoint into the final results file in input order;
+        # in incremental mode only profiles with new tweets produce output.
+        # Microseconds keep back-to-back runs (e.g. the daemon's) from sharing a file name
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        final_filename = f'nitter_results/nitter_results_{timestamp}.json'
+        keep = (lambda r: not r['success'] or r['tweets']) if incremental else None
+        summary = consolidate(checkpoint_file, final_filename, urls, keep=keep)
+        failed_urls = summary['failed_urls']
+        if incremental:
+            logging.info(f"{summary['total'] - summary['written']} profiles have no new tweets")
+        
+        # Only advance the high-water marks once the results are on disk
+        if state_store:
+            state_store.save()
+        if tweet_index:
+            logging.info(f"Indexed {tweet_index.commit()} newly crawled tweets")
+        if tweet_store:
+            stored = tweet_store.add_results(read_checkpoint(checkpoint_file), 'nitter')
+            logging.info(f"Stored {stored} tweets in {tweet_store.path}")
+        os.remove(checkpoint_file)
+    finally:
+        # The checkpoint stays on disk for --resume if we did not finish
+        checkpoint.close()
+    
+    # Save failed URLs
+    if failed_urls:
+        failed_filename = f'nitter_results/failed_urls_{timestamp}.txt'
+        write_failed_urls(failed_filename, failed_urls)
+        logging.warning(f"Failed to crawl {len(failed_urls)} URLs. See {failed_filename} for details")
+    
+    logging.info(f"Crawling completed! Final results saved to {final_filename}")
+    logging.info(f"Successfully crawled: {summary['total'] - len(failed_urls)} URLs")
+    logging.info(f"Failed to crawl: {len(failed_urls)} URLs")
+    if scheduler.retries:
+        logging.info(f"Retries by error type: {dict(scheduler.retries)}")
+    if scheduler.dead and dead_letter_file and not replay:
+        logging.warning(f"{len(scheduler.dead)} profiles dead-lettered to {dead_letter_file}")
+    logging.info(f"Wall time: {wall_time:.1f}s, {progress['done'] / wall_time * 60:.1f} profiles/min "
+                 f"({len(crawlers)} workers)")
+    wait_times = [t for crawler in crawlers for t in crawler.wait_times.values()]
+    if wait_times:
+        logging.info(f"Page readiness wait: avg {sum(wait_times) / len(wait_times):.2f}s, "
+                     f"max {max(wait_times):.2f}s")
+    fast_path = sum(crawler.stats['fast_path'] for crawler in crawlers)
+    browser_path = sum(crawler.stats['browser'] for crawler in crawlers)
+    if fast_path + browser_path:
+        logging.info(f"HTTP fast path served {fast_path}/{fast_path + browser_path} profiles "
+                     f"({fast_path / (fast_path + browser_path):.0%}), browser served {browser_path}")
+    crawlers[0].pool.log_report()
+    if crawlers[0].page_cache:
+        crawlers[0].page_cache.log_summary()
+    if blocker:
+        blocker.log_summary()
+    for host, rate in crawlers[0].rate_limiter.rates().items():
+        logging.info(f"Final request rate for {host}: {rate:.2f} req/s")
+    
+    # Export this run's stage timings and counters
+    for error_type, count in scheduler.retries.items():
+        run_metrics.inc('retries_total', count, error_type=error_type)
+    run_metrics.inc('dead_letters_total', len(scheduler.dead))
+    run_metrics.set('profiles', summary['total'])
+    run_metrics.set('failed_profiles', len(failed_urls))
+    run_metrics.finish()
+    run_metrics.log_summary()
+    summary_file = f'nitter_results/run_summary_{timestamp}.json'
+    run_metrics.write(metrics_file, summary_file)
+    logging.info(f"Run metrics written to {metrics_file} and {summary_file}")
+    return {**summary, 'results_file': final_filename, 'wall_time': wall_time, 'metrics': run_metrics}
+
+async def main(concurrency=DEFAULT_CONCURRENCY, fetch_mode='auto', block_resources=True, incremental=True,
+               resume=False, instances=DEFAULT_NITTER_INSTANCES, deadline=None, cache_dir=DEFAULT_CACHE_DIR,
+               replay=False, metrics_file=NITTER_METRICS_FILE, store_path=DEFAULT_STORE_PATH, use_cache=False,
+               allow_domains=(), deny_domains=()):
+    # List of URLs to crawl
+    async with async_playwright() as playwright:
+        # Replay serves every profile from the page cache: no browser, no network,
+        # and the incremental state is left untouched
+        if replay:
+            browser = context = None
+            incremental = False
+        else:
+            browser, context = await launch_browser(playwright)
+        # Live runs only write the cache unless asked to serve fresh-enough pages from it
+        page_cache = PageCache(cache_dir, replay=replay, read=use_cache) if cache_dir else None
+        
+        # One crawler (and page) per worker
+        # All workers share one per-host rate limiter
+        concurrency = max(1, min(concurrency, len(NITTER_URLS)))
+        rate_limiter = HostRateLimiter()
+        http_fetcher = await NitterHttpFetcher(limit=concurrency * 2).start() \
+            if fetch_mode == 'auto' and not replay else None
+        blocker = ResourceBlocker(block_types=NITTER_BLOCK_TYPES, deny_domains=TRACKER_DOMAINS + list(deny_domains),
+                                  allow_domains=allow_domains) if block_resources else None
+        os.makedirs('nitter_results', exist_ok=True)
+        state_store = CrawlStateStore(NITTER_STATE_FILE) if incremental else None
+        tweet_index = TweetIndex() if incremental else None
+        # Replayed results are already in the tweet store
+        tweet_store = TweetStore(store_path) if store_path and not replay else None
+        pool = NitterInstancePool(instances)
+        crawlers = []
+        for _ in range(concurrency):
+            crawler = NitterCrawler(rate_limiter=rate_limiter, http_fetcher=http_fetcher,
+                                    state_store=state_store, pool=pool, tweet_index=tweet_index,
+                                    page_cache=page_cache)
+            if context:
+                crawler.page = await new_crawler_page(context, blocker)
+            crawlers.append(crawler)
+        
+        try:
+            await run_crawl(crawlers, resume=resume, deadline=deadline, replay=replay, tweet_store=tweet_store,
+                            blocker=blocker, metrics_file=metrics_file)
         finally:
-            # Clean up
-            await context.close()
-            await browser.close()
+            if tweet_index:
+                tweet_index.close()
+            if tweet_store:
+                tweet_store.close()
+            if http_fetcher:
+                await http_fetcher.close()
+            if page_cache:
+                page_cache.close()
+            if context:
+                await context.close()
+                await browser.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl Twitter profiles through Nitter")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"number of pages crawling in parallel (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--fetch-mode', choices=['auto', 'browser'], default='auto',
+                        help="auto tries plain HTTP first and falls back to the browser (default: auto)")
+    parser.add_argument('--no-block', action='store_true',
+                        help="load images, media, fonts and stylesheets in the browser")
+    parser.add_argument('--allow-domains', default='',
+                        help="comma-separated domains never blocked, e.g. a CDN a page needs to render")
+    parser.add_argument('--deny-domains', default='',
+                        help="comma-separated domains always blocked, on top of the built-in trackers")
+    parser.add_argument('--full', action='store_true',
+                        help="ignore the per-profile high-water marks and the tweet index and re-extract every tweet")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue from the checkpoint, skipping profiles that already succeeded")
+    parser.add_argument('--instances', default=os.environ.get('NITTER_INSTANCES', ','.join(DEFAULT_NITTER_INSTANCES)),
+                        help="comma-separated Nitter base URLs to spread requests over "
+                             "(default: $NITTER_INSTANCES or https://nitter.net)")
+    parser.add_argument('--deadline', type=float, default=None,
+                        help="overall run deadline in minutes; unfinished profiles are dead-lettered")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f"page cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--no-cache', action='store_true', help="neither read nor write the page cache")
+    parser.add_argument('--use-cache', action='store_true',
+                        help="serve profiles fetched within the cache TTL (1 h) from the page cache "
+                             "instead of fetching them (default: live runs only write the cache)")
+    parser.add_argument('--replay', action='store_true',
+                        help="crawl entirely from the page cache without a browser or network access")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH,
+                        help=f"SQLite tweet store the results are added to (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('--no-store', action='store_true', help="only write the JSON results file")
+    parser.add_argument('--metrics-file', default=NITTER_METRICS_FILE,
+                        help=f"Prometheus text file for the run's metrics, e.g. in node_exporter's textfile "
+                             f"directory (default: {NITTER_METRICS_FILE})")
+    args = parser.parse_args()
+    if args.no_cache and (args.replay or args.use_cache):
+        parser.error("--replay and --use-cache need the page cache")
+    instances = [base_url.strip() for base_url in args.instances.split(',') if base_url.strip()]
+    if not instances:
+        parser.error("--instances (or $NITTER_INSTANCES) must list at least one Nitter base URL")
+    
     try:
-        asyncio.run(main())
+        asyncio.run(main(concurrency=args.concurrency, fetch_mode=args.fetch_mode,
+                         block_resources=not args.no_block, incremental=not args.full,
+                         resume=args.resume, instances=instances,
+                         deadline=args.deadline * 60 if args.deadline else None,
+                         cache_dir=None if args.no_cache else args.cache_dir, replay=args.replay,
+                         metrics_file=args.metrics_file, store_path=None if args.no_store else args.store,
+                         use_cache=args.use_cache, allow_domains=split_domains(args.allow_domains),
+                         deny_domains=split_domains(args.deny_domains)))
     except KeyboardInterrupt:
         logging.warning("Crawling interrupted by user")
     except Exception as e:
@@ -0,0 +1,90 @@
+import logging
+import random
+import time
+from urllib.parse import urlparse
+
+DEFAULT_NITTER_INSTANCES = ['https://nitter.net']
+
+
+class NitterInstance:
+    """One Nitter mirror with rolling health and latency scores"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.host = urlparse(self.base_url).hostname
+        self.health = 1.0      # EWMA of success (1) / failure (0)
+        self.latency = None    # EWMA of seconds per profile
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # circuit breaker: unavailable until this monotonic time
+        self.trips = 0
+        self.in_flight = 0
+
+    def available(self, now):
+        return now >= self.open_until
+
+    def score(self):
+        """Higher is better: healthy, fast and not already busy"""
+        latency = self.latency if self.latency is not None else 1.0
+        return max(self.health, 0.01) / (latency + 0.5) / (1 + self.in_flight)
+
+
+class NitterInstancePool:
+    """Spread profile requests across healthy Nitter mirrors"""
+
+    def __init__(self, base_urls=DEFAULT_NITTER_INSTANCES, failure_threshold=3, cooldown=120, alpha=0.3):
+        self.instances = [NitterInstance(base_url) for base_url in base_urls]
+        if not self.instances:
+            raise ValueError("At least one Nitter instance is required")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.alpha = alpha
+
+    def pick(self, exclude=()):
+        """Pick an instance weighted by score, skipping excluded ones and open circuits"""
+        now = time.monotonic()
+        candidates = [i for i in self.instances if i.base_url not in exclude]
+        if not candidates:
+            return None
+        healthy = [i for i in candidates if i.available(now)]
+        if not healthy:
+            # Everything is cooling down: try the one that reopens first
+            return min(candidates, key=lambda i: i.open_until)
+        return random.choices(healthy, weights=[i.score() for i in healthy])[0]
+
+    def url_for(self, instance, url):
+        """Rewrite a nitter URL onto the instance's base URL"""
+        parsed = urlparse(url)
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else '')
+        return f"{instance.base_url}{path}"
+
+    def start(self, instance):
+        instance.requests += 1
+        instance.in_flight += 1
+
+    def record_success(self, instance, latency):
+        instance.in_flight -= 1
+        instance.health = (1 - self.alpha) * instance.health + self.alpha
+        instance.latency = latency if instance.latency is None else \
+            (1 - self.alpha) * instance.latency + self.alpha * latency
+        instance.consecutive_failures = 0
+
+    def record_failure(self, instance, reason=''):
+        instance.in_flight -= 1
+        instance.failures += 1
+        instance.health = (1 - self.alpha) * instance.health
+        instance.consecutive_failures += 1
+        if instance.consecutive_failures >= self.failure_threshold:
+            instance.trips += 1
+            instance.open_until = time.monotonic() + self.cooldown
+            logging.warning(f"Circuit open for {instance.base_url} for {self.cooldown}s "
+                            f"after {instance.consecutive_failures} failures: {reason}")
+
+    def log_report(self):
+        for i in self.instances:
+            success_rate = (i.requests - i.failures) / i.requests if i.requests else 0
+            latency = f"{i.latency:.2f}s" if i.latency is not None else "n/a"
+            state = 'open' if not i.available(time.monotonic()) else 'closed'
+            logging.info(f"Instance {i.base_url}: {i.requests} requests, {success_rate:.0%} success, "
+                         f"latency {latency}, health {i.health:.2f}, circuit {state} (tripped {i.trips}x)")
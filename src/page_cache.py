@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import Counter, namedtuple
+
+from retry_scheduler import CrawlError
+
+DEFAULT_CACHE_DIR = 'page_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Seconds a cached response stays fresh, per source
+SOURCE_TTLS = {
+    'nitter': 3600,
+    'twitter': 3600,
+    'techcrunch': 900,
+}
+DEFAULT_TTL = 3600
+
+CachedPage = namedtuple('CachedPage', 'url source status content_type body fetched_at')
+
+
+class CacheMissError(CrawlError):
+    """Replay mode found nothing cached for a URL"""
+    error_type = 'cache_miss'
+
+
+class PageCache:
+    """Gzipped response bodies stored once per sha256, indexed by URL in SQLite
+
+    Entries expire per source TTL, and the least recently used URLs are
+    evicted once the blobs exceed max_bytes. In replay mode every cached
+    entry is served regardless of age and nothing is written. With
+    read=False the cache is write-only: live runs that must always see the
+    site still keep their pages for a later replay.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttls=None, replay=False, read=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls = {**SOURCE_TTLS, **(ttls or {})}
+        self.replay = replay
+        self.read = read or replay
+        self.stats = Counter()
+        os.makedirs(os.path.join(cache_dir, 'blobs'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'index.db'), timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                status INTEGER,
+                content_type TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256)')
+
+    def blob_path(self, sha256):
+        return os.path.join(self.cache_dir, 'blobs', sha256[:2], f'{sha256}.gz')
+
+    def get(self, url, source):
+        """Cached response for url, or None if missing, older than the source's TTL or the cache is write-only"""
+        if not self.read:
+            return None
+        row = self.conn.execute('SELECT sha256, status, content_type, fetched_at FROM pages WHERE url = ?',
+                                (url,)).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        sha256, status, content_type, fetched_at = row
+        if not self.replay and time.time() - fetched_at > self.ttls.get(source, DEFAULT_TTL):
+            self.stats['stale'] += 1
+            return None
+        try:
+            with gzip.open(self.blob_path(sha256), 'rb') as f:
+                body = f.read()
+        except (OSError, EOFError) as e:
+            logging.warning(f"Dropping unreadable cache entry for {url}: {str(e)}")
+            self.conn.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self.stats['misses'] += 1
+            return None
+        self.conn.execute('UPDATE pages SET accessed_at = ? WHERE url = ?', (time.time(), url))
+        self.stats['hits'] += 1
+        return CachedPage(url, source, status, content_type, body, fetched_at)
+
+    def get_text(self, url, source):
+        page = self.get(url, source)
+        return page.body.decode('utf-8', errors='replace') if page else None
+
+    def put(self, url, source, body, status=200, content_type='text/html'):
+        """Store a response body; identical bodies share one blob"""
+        if self.replay:
+            return
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(body, compresslevel=6))
+            os.replace(tmp_path, path)
+        now = time.time()
+        self.conn.execute('''
+            INSERT INTO pages (url, source, sha256, status, content_type, size, fetched_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET source = excluded.source, sha256 = excluded.sha256,
+                status = excluded.status, content_type = excluded.content_type, size = excluded.size,
+                fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at
+        ''', (url, source, sha256, status, content_type, os.path.getsize(path), now, now))
+        self.stats['stores'] += 1
+        self.evict()
+
+    def total_bytes(self):
+        (total,) = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM pages GROUP BY sha256)').fetchone()
+        return total
+
+    def evict(self):
+        """Drop least recently used URLs until the blobs fit in 90% of max_bytes"""
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        orphaned = set()
+        for url, sha256, size in self.conn.execute(
+                'SELECT url, sha256, size FROM pages ORDER BY accessed_at').fetchall():
+            self.conn.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self.stats['evictions'] += 1
+            if not self.conn.execute('SELECT 1 FROM pages WHERE sha256 = ? LIMIT 1', (sha256,)).fetchone():
+                orphaned.add(sha256)
+                total -= size
+            if total <= target:
+                break
+        for sha256 in orphaned:
+            try:
+                os.remove(self.blob_path(sha256))
+            except FileNotFoundError:
+                pass
+
+    def log_summary(self):
+        logging.info(f"Page cache {self.cache_dir}: {self.stats['hits']} hits, {self.stats['misses']} misses, "
+                     f"{self.stats['stale']} stale, {self.stats['stores']} stored, "
+                     f"{self.stats['evictions']} evicted, {self.total_bytes() / 1024 / 1024:.1f} MiB on disk")
+
+    def close(self):
+        self.conn.close()
@@ -1,13 +1,30 @@
 import json
 import glob
 import os
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime
 import re
+import logging
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import ijson
+import hashlib
+from contextlib import nullcontext
+from crawl_state import tweet_id_from_url
+from tweet_index import TweetIndex, DEFAULT_INDEX_PATH, canonical_tweet_id
+from near_dup import collapse_tweets, DEFAULT_THRESHOLD
+from timestamps import recency_cutoff, recent_mask
+from run_metrics import RunMetrics
+from tweet_store import TweetStore, DEFAULT_STORE_PATH
 
-def create_prompt(texts):
-    combined_text = "\n\n".join([f"推文 {i+1}:\n{text['text']}\n来源: {text['url'] if text.get('url') else '无链接'}\n互动数据: 转发 {text['metrics'].get('retweet', 0)} | 回复 {text['metrics'].get('reply', 0)} | 点赞 {text['metrics'].get('like', 0)}" for i, text in enumerate(texts)])
-    return f"""请以科技主编的视角总结以下推文内容，可以详细介绍，要求：
+logger = logging.getLogger(__name__)
+
+# 记录每个输入文件的大小、修改时间、内容哈希和生成的提示文件
+MANIFEST_FILE = 'prompts/manifest.json'
+# 每次运行结束时重写的 Prometheus 文本文件；JSON 运行摘要也写在 prompts 目录
+METRICS_FILE = 'prompts/metrics.prom'
+
+PROMPT_HEADER = """请以科技主编的视角总结以下推文内容，可以详细介绍，要求：
 
 1. 内容要求：
    - 交代清楚背景信息
@@ -21,50 +38,337 @@ def create_prompt(texts):
    - 对于推测性内容，必须明确标注"推测"或"可能"
    - 对于有争议的内容，需要标注不同观点及其来源
    - 所有引用的外部信息必须是可公开访问的网络资料
-"""
 
-def parse_nitter_timestamp(timestamp_str):
-    """解析nitter格式的时间戳"""
+以下是推文："""
+
+# 每个提示的 token 预算和最多生成几个提示，超出的低互动推文会被丢弃
+DEFAULT_TOKEN_BUDGET = 8000
+DEFAULT_MAX_PROMPTS = 4
+
+CJK_RE = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中日韩字符每个约 1 个 token，其余约 4 个字符 1 个 token"""
+    cjk = len(CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def engagement(tweet):
+    """互动分数，转发和回复比点赞更能说明讨论热度"""
+    metrics = tweet.get('metrics') or {}
+    return metrics.get('retweet', 0) * 3 + metrics.get('reply', 0) * 2 + metrics.get('like', 0)
+
+def format_tweet(number, tweet):
+    metrics = tweet.get('metrics') or {}
+    part = f" (第 {tweet['part']} 段)" if tweet.get('part') else ''
+    return (f"推文 {number}{part}:\n{tweet['text']}\n来源: {tweet['url'] if tweet.get('url') else '无链接'}\n"
+            f"互动数据: 转发 {metrics.get('retweet', 0)} | 回复 {metrics.get('reply', 0)} | 点赞 {metrics.get('like', 0)}")
+
+def split_text(text, max_tokens):
+    """按估算的 token 数把过长的文本切成多段"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start
+        tokens = 0
+        while end < len(text):
+            cost = 1 if CJK_RE.match(text[end]) else 0.25
+            if tokens + cost > max_tokens and end > start:
+                break
+            tokens += cost
+            end += 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+def create_prompt(texts):
+    """用一个列表拼接出完整提示，避免反复拼接字符串"""
+    parts = [PROMPT_HEADER]
+    for i, text in enumerate(texts):
+        parts.append(format_tweet(i + 1, text))
+    return "\n\n".join(parts)
+
+def prompt_room(token_budget):
+    """返回 (提示头, 每条推文的固定开销, 单条推文最多可用) 的 token 数；预算装不下提示头时抛出 ValueError"""
+    header_tokens = estimate_tokens(PROMPT_HEADER)
+    # 编号和分隔符按最长的情况估算
+    overhead = estimate_tokens(format_tweet(9999, {'text': '', 'url': '', 'metrics': {}})) + 1
+    room = token_budget - header_tokens - overhead
+    if room <= 0:
+        raise ValueError(f"Token budget {token_budget} is smaller than the prompt header "
+                         f"(needs more than {header_tokens + overhead})")
+    return header_tokens, overhead, room
+
+def pack_prompts(tweets, token_budget=DEFAULT_TOKEN_BUDGET, max_prompts=DEFAULT_MAX_PROMPTS):
+    """按互动分数从高到低把推文装进若干个不超过 token 预算的提示
+
+    返回 (每个提示的推文列表, 统计)；过长的推文会被拆成几段，
+    装不下的低互动推文会被丢弃。
+    """
+    header_tokens, overhead, room = prompt_room(token_budget)
+    
+    stats = {'tweets': 0, 'split': 0, 'dropped': 0}
+    pieces = []
+    for rank, tweet in enumerate(sorted(tweets, key=engagement, reverse=True)):
+        stats['tweets'] += 1
+        url_tokens = estimate_tokens(tweet.get('url') or '')
+        if estimate_tokens(tweet['text']) + url_tokens <= room:
+            pieces.append((rank, tweet))
+            continue
+        # 单条推文超过预算：拆成几段，每段带上来源和互动数据
+        chunks = split_text(tweet['text'], max(1, room - url_tokens))
+        stats['split'] += 1
+        for k, chunk in enumerate(chunks, start=1):
+            pieces.append((rank, {**tweet, 'text': chunk, 'part': f"{k}/{len(chunks)}"}))
+    
+    # 依次装箱：当前提示装不下就开新的，达到上限后装不下的丢弃
+    packed = []
+    used = token_budget
+    dropped = set()
+    for rank, piece in pieces:
+        cost = estimate_tokens(piece['text']) + estimate_tokens(piece.get('url') or '') + overhead
+        if used + cost > token_budget:
+            if max_prompts and len(packed) >= max_prompts:
+                dropped.add(rank)
+                continue
+            packed.append([])
+            used = header_tokens
+        packed[-1].append(piece)
+        used += cost
+    stats['dropped'] = len(dropped)
+    stats['prompts'] = len(packed)
+    return packed, stats
+
+class HashingReader:
+    """边读边计算 sha256，解析和计算内容哈希只读一遍文件"""
+    
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+    
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        return data
+
+def iter_profiles(file_path, fingerprint=None):
+    """流式读取结果文件中的主页记录，不把整个文件载入内存；读完后把内容哈希写入 fingerprint"""
+    with open(file_path, 'rb') as f:
+        reader = HashingReader(f)
+        yield from ijson.items(reader, 'item', use_float=True)
+        if fingerprint is not None:
+            # 把解析器没读完的尾部也算进哈希
+            while reader.read(1 << 16):
+                pass
+            fingerprint['sha256'] = reader.sha256.hexdigest()
+
+def filter_tweets(profiles, cutoff):
+    """过滤：跳过无推文的主页、空文本和 cutoff 之前的推文"""
+    for item in profiles:
+        if not item.get('tweets'):
+            print(f"跳过无推文的URL: {item.get('url')}")
+            continue
+        
+        tweets = [tweet for tweet in item['tweets'] if tweet.get('text')]
+        
+        # 按主页批量检查是否是最近的推文
+        for tweet, is_recent in zip(tweets, recent_mask([tweet.get('timestamp') for tweet in tweets], cutoff)):
+            if is_recent:
+                yield item, tweet
+
+def normalize_tweets(pairs):
+    """规范化为提示文件中的推文格式"""
+    for item, tweet in pairs:
+        yield {
+            "user": item.get('username', 'Unknown'),
+            "text": tweet['text'],
+            "url": tweet.get('url', ''),
+            "metrics": tweet.get('metrics', {})
+        }
+
+def emit_prompt_file(tweets, output_file, token_budget=DEFAULT_TOKEN_BUDGET, max_prompts=DEFAULT_MAX_PROMPTS):
+    """写出提示文件，返回 (装箱统计, 每个提示的推文列表)（tweets 为 0 表示没有输出）"""
+    all_tweets = list(tweets)
+    if not all_tweets:
+        return {'tweets': 0, 'split': 0, 'dropped': 0, 'prompts': 0}, []
+    
+    packed, stats = pack_prompts(all_tweets, token_budget, max_prompts)
+    prompts = [create_prompt(batch) for batch in packed]
+    
+    # 准备输出的JSON数据；prompt 保留第一个提示，兼容只读单个提示的下游
+    output_data = {
+        "instruction": "请总结以下所有推文，按不同主题分类呈现",
+        "tweets": all_tweets,
+        "prompt": prompts[0],
+        "prompts": prompts,
+        "packing": {"token_budget": token_budget, **stats}
+    }
+    
+    # 先写临时文件再改名，中途失败不会留下半个提示文件
+    tmp_path = f"{output_file}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(output_data, f, ensure_ascii=False)
+    os.replace(tmp_path, output_file)
+    return stats, packed
+
+def file_stat(file_path):
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def file_sha256(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def load_manifest(path=MANIFEST_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def is_unchanged(file_path, entry, settings):
+    """输入文件和处理参数自上次处理后都没有变化（先比较大小和修改时间，修改时间变了再比较内容哈希）"""
+    if not entry or any(entry.get(key) != value for key, value in settings.items()):
+        return False
+    if entry.get('count') and not os.path.exists(entry.get('output', '')):
+        return False
+    stat = file_stat(file_path)
+    if stat['size'] != entry['size']:
+        return False
+    if stat['mtime_ns'] == entry['mtime_ns']:
+        return True
+    if file_sha256(file_path) == entry['sha256']:
+        entry['mtime_ns'] = stat['mtime_ns']  # 只是被 touch 过
+        return True
+    return False
+
+def skip_summarized(tweets, tweet_index):
+    """跳过推文索引里已经总结过的推文（包括 Nitter 和 X 两个来源的重复），只检查不标记"""
+    tweets = list(tweets)
+    new_tweets = tweet_index.unseen(tweets, stage='summarized')
+    if len(new_tweets) < len(tweets):
+        print(f"跳过 {len(tweets) - len(new_tweets)} 条已经总结过的推文")
+    return new_tweets
+
+def packed_tweet_ids(packed):
+    """装进提示的推文 ID，包括合并进来的近似重复推文"""
+    ids = set()
+    for batch in packed:
+        for tweet in batch:
+            ids.add(canonical_tweet_id(tweet))
+            ids.update(tweet_id_from_url(url) for url in tweet.get('duplicates') or [])
+    ids.discard(None)
+    return sorted(int(tweet_id) for tweet_id in ids)
+
+def merge_near_duplicates(tweets, threshold=DEFAULT_THRESHOLD):
+    """把内容几乎相同的推文（如 OpenAI 各个账号转发的同一条公告）合并成一条，互动数据相加"""
+    tweets = list(tweets)
+    merged = collapse_tweets(tweets, score=engagement, threshold=threshold)
+    if len(merged) < len(tweets):
+        print(f"合并了 {len(tweets) - len(merged)} 条近似重复的推文")
+    return merged
+
+def summarize_tweets(tweets, output_file, run_metrics, index_path=DEFAULT_INDEX_PATH,
+                     token_budget=DEFAULT_TOKEN_BUDGET, max_prompts=DEFAULT_MAX_PROMPTS,
+                     dup_threshold=DEFAULT_THRESHOLD):
+    """去重 → 合并近似重复 → 装箱输出 → 认领，返回装箱统计
+
+    推文索引的写锁一直持有到提示文件写完：只有真正装进提示的推文才标记为已总结，
+    中途出错时认领全部回滚，并行的其他进程也不会在这期间认领同一批推文
+    """
+    prompt_room(token_budget)
+    run_metrics.inc('tweets_total', len(tweets), stage='loaded')
+    tweet_index = TweetIndex(index_path) if index_path else None
     try:
-        # 处理 "Jun 10, 2025 · 10:58 PM UTC" 格式
-        if "·" in timestamp_str:
-            # 提取日期部分
-            date_str = timestamp_str.split("·")[0].strip()
-            # 提取时间部分
-            time_str = timestamp_str.split("·")[1].strip().split(" UTC")[0].strip()
-            
-            # 解析日期和时间
-            date_obj = datetime.strptime(date_str, "%b %d, %Y")
-            time_obj = datetime.strptime(time_str, "%I:%M %p")
-            
-            # 组合日期和时间
-            combined = datetime.combine(date_obj.date(), time_obj.time())
-            # 添加UTC时区
-            return pytz.UTC.localize(combined)
-        else:
-            # 处理 ISO 格式的时间戳
-            return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-    except Exception as e:
-        print(f'Error parsing timestamp {timestamp_str}: {e}')
-        return None
-
-def is_recent_tweet(tweet, days=7):
-    """检查推文是否在指定天数内"""
+        with tweet_index.locked() if tweet_index else nullcontext():
+            if tweet_index:
+                with run_metrics.stage('dedup'):
+                    tweets = skip_summarized(tweets, tweet_index)
+                run_metrics.inc('tweets_total', len(tweets), stage='new')
+            if dup_threshold:
+                with run_metrics.stage('merge'):
+                    tweets = merge_near_duplicates(tweets, dup_threshold)
+                run_metrics.inc('tweets_total', len(tweets), stage='merged')
+            with run_metrics.stage('emit'):
+                stats, packed = emit_prompt_file(tweets, output_file, token_budget, max_prompts)
+            if tweet_index:
+                with run_metrics.stage('claim'):
+                    tweet_index.claim(packed_tweet_ids(packed), stage='summarized')
+    finally:
+        if tweet_index:
+            tweet_index.close()
+    run_metrics.inc('tweets_total', stats['dropped'], stage='dropped')
+    run_metrics.inc('prompts_total', stats['prompts'])
+    return stats
+
+def process_result_file(file_path, cutoff, output_dir='prompts', index_path=DEFAULT_INDEX_PATH,
+                        token_budget=DEFAULT_TOKEN_BUDGET, max_prompts=DEFAULT_MAX_PROMPTS,
+                        dup_threshold=DEFAULT_THRESHOLD):
+    """处理单个结果文件：读取 → 过滤 → 规范化 → 去重 → 合并近似重复 → 装箱输出（在进程池中运行）
+
+    返回的 RunMetrics 记录各阶段耗时，由主进程合并
+    """
+    run_metrics = RunMetrics('process_tweets')
+    output_file = os.path.join(output_dir, f'prompts_{os.path.basename(file_path)}')
+    if index_path and os.path.exists(output_file):
+        # 去重后只剩新增的推文，不能覆盖上次的提示文件，另起一个带时间的文件名
+        stem, ext = os.path.splitext(output_file)
+        output_file = f"{stem}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+    fingerprint = file_stat(file_path)
+    with run_metrics.stage('load'):
+        tweets = list(normalize_tweets(filter_tweets(iter_profiles(file_path, fingerprint), cutoff)))
+    stats = summarize_tweets(tweets, output_file, run_metrics, index_path, token_budget, max_prompts, dup_threshold)
+    return output_file, stats, fingerprint, run_metrics
+
+def write_run_metrics(run_metrics, metrics_file=METRICS_FILE):
+    """导出本次运行的各阶段耗时和计数"""
+    run_metrics.finish()
+    run_metrics.log_summary()
+    summary_file = f"prompts/run_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    run_metrics.write(metrics_file, summary_file)
+    print(f"运行指标已写入 {metrics_file} 和 {summary_file}")
+
+def process_store(store_path=DEFAULT_STORE_PATH, days=7, users=None, dedup=True,
+                  token_budget=DEFAULT_TOKEN_BUDGET, max_prompts=DEFAULT_MAX_PROMPTS,
+                  dup_threshold=DEFAULT_THRESHOLD, metrics_file=METRICS_FILE):
+    """从推文库按时间（和用户）范围查询两个来源的推文，生成一个提示文件
+
+    时间过滤走 posted_at 索引，不再读取所有结果文件；已经总结过的推文由推文索引跳过
+    """
+    os.makedirs('prompts', exist_ok=True)
+    run_metrics = RunMetrics('process_tweets')
+    output_file = f"prompts/prompts_store_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    
+    store = TweetStore(store_path)
     try:
-        tweet_time = parse_nitter_timestamp(tweet['timestamp'])
-        if not tweet_time:
-            return True  # 如果无法解析时间，默认包含
-            
-        cutoff_time = datetime.now(pytz.UTC) - timedelta(days=days)
-        print(f'Debug - Tweet time: {tweet_time} (type: {type(tweet_time)})')
-        print(f'Debug - Cutoff time: {cutoff_time} (type: {type(cutoff_time)})')
-        print(f'Debug - Is recent: {tweet_time >= cutoff_time}')
-        return tweet_time >= cutoff_time
-    except Exception as e:
-        print(f'Error checking recent tweet: {e}')
-        return True  # 如果无法解析时间，默认包含
-
-def process_nitter_results():
+        with run_metrics.stage('load'):
+            pairs = store.query(users, since=recency_cutoff(days))
+            tweets = list(normalize_tweets((profile, tweet) for profile, tweet in pairs if tweet.get('text')))
+    finally:
+        store.close()
+    
+    index_path = DEFAULT_INDEX_PATH if dedup else None
+    stats = summarize_tweets(tweets, output_file, run_metrics, index_path, token_budget, max_prompts, dup_threshold)
+    if stats['tweets']:
+        print(f"生成提示文件: {output_file}（{stats['tweets']} 条推文，{stats['prompts']} 个提示，"
+              f"拆分 {stats['split']} 条长推文，丢弃 {stats['dropped']} 条低互动推文）")
+    else:
+        print(f"推文库 {store_path} 中没有符合条件的新推文")
+    write_run_metrics(run_metrics, metrics_file)
+
+def process_nitter_results(max_workers=None, days=7, force=False, dedup=True,
+                           token_budget=DEFAULT_TOKEN_BUDGET, max_prompts=DEFAULT_MAX_PROMPTS,
+                           dup_threshold=DEFAULT_THRESHOLD, metrics_file=METRICS_FILE):
+    # 预算装不下提示头时在处理任何文件之前就报错
+    prompt_room(token_budget)
+    
     # 获取所有nitter_results文件
     result_files = glob.glob('nitter_results/nitter_results_*.json')
     
@@ -76,64 +380,107 @@ def process_nitter_results():
     if not os.path.exists('prompts'):
         os.makedirs('prompts')
     
-    for file_path in result_files:
-        try:
-            print(f"\n处理文件: {file_path}")
-            
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 创建对应的输出文件
-            output_file = os.path.join('prompts', f'prompts_{os.path.basename(file_path)}')
-            
-            # 收集所有推文
-            all_tweets = []
-            
-            for item in data:
-                if not item.get('tweets'):
-                    print(f"跳过无推文的URL: {item.get('url')}")
+    run_metrics = RunMetrics('process_tweets')
+    
+    # 根据清单跳过上次处理后没有变化的文件
+    manifest = load_manifest()
+    settings = {'days': days, 'token_budget': token_budget, 'max_prompts': max_prompts,
+                'dup_threshold': dup_threshold}
+    if not force:
+        pending = [file_path for file_path in result_files
+                   if not is_unchanged(file_path, manifest.get(file_path), settings)]
+        if len(pending) < len(result_files):
+            print(f"跳过 {len(result_files) - len(pending)} 个未变化的文件（使用 --force 重新处理）")
+            run_metrics.inc('files_total', len(result_files) - len(pending), outcome='unchanged')
+        result_files = pending
+    
+    # 时间窗口只算一次，所有文件共用
+    cutoff = recency_cutoff(days)
+    
+    # 多个文件并行处理
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        index_path = DEFAULT_INDEX_PATH if dedup else None
+        futures = {executor.submit(process_result_file, file_path, cutoff, index_path=index_path,
+                                   token_budget=token_budget, max_prompts=max_prompts,
+                                   dup_threshold=dup_threshold): file_path
+                   for file_path in result_files}
+        
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                output_file, stats, fingerprint, file_metrics = future.result()
+                run_metrics.merge(file_metrics)
+                count = stats['tweets']
+                previous = manifest.get(file_path) or {}
+                output = output_file if count else None
+                if not count and previous.get('output') and os.path.exists(previous['output']):
+                    # 没有新推文时清单仍指向上次的提示文件
+                    output, count = previous['output'], previous.get('count', 0)
+                manifest[file_path] = {
+                    **fingerprint,
+                    **settings,
+                    'output': output,
+                    'count': count,
+                    'processed_at': datetime.now().isoformat()
+                }
+                if not stats['tweets']:
+                    print(f"文件 {file_path} 中没有符合条件的新推文")
+                    run_metrics.inc('files_total', outcome='empty')
                     continue
                 
-                # 处理推文
-                for tweet in item['tweets']:
-                    if not tweet.get('text'):
-                        continue
-                        
-                    # 检查是否是最近7天的推文
-                    if not is_recent_tweet(tweet):
-                        continue
-                    
-                    # 添加到推文列表
-                    all_tweets.append({
-                        "user": item.get('username', 'Unknown'),
-                        "text": tweet['text'],
-                        "url": tweet.get('url', ''),
-                        "metrics": tweet.get('metrics', {})
-                    })
-            
-            if not all_tweets:
-                print(f"文件 {file_path} 中没有符合条件的推文")
-                continue
-            
-            # 准备输出的JSON数据
-            output_data = {
-                "instruction": "请总结以下所有推文，按不同主题分类呈现",
-                "tweets": all_tweets,
-                "prompt": create_prompt(all_tweets)
-            }
-            
-            # 写入JSON文件
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, ensure_ascii=False, indent=2)
-            
-            print(f"成功处理文件: {file_path}")
-            print(f"生成提示文件: {output_file}")
-            
-        except Exception as e:
-            print(f"处理文件 {file_path} 时出错: {str(e)}")
-            print(f"错误详情: {type(e).__name__}")
-            import traceback
-            print(traceback.format_exc())
+                run_metrics.inc('files_total', outcome='processed')
+                print(f"成功处理文件: {file_path}")
+                print(f"生成提示文件: {output_file}（{stats['prompts']} 个提示，"
+                      f"拆分 {stats['split']} 条长推文，丢弃 {stats['dropped']} 条低互动推文）")
+                
+            except Exception as e:
+                run_metrics.inc('files_total', outcome='failed')
+                run_metrics.error(type(e).__name__)
+                print(f"处理文件 {file_path} 时出错: {str(e)}")
+                print(f"错误详情: {type(e).__name__}")
+                print(traceback.format_exc())
+    
+    save_manifest(manifest)
+    write_run_metrics(run_metrics, metrics_file)
 
 if __name__ == "__main__":
-    process_nitter_results() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="把推文库或 nitter_results 里最近的推文生成提示文件")
+    parser.add_argument('--input', choices=['store', 'files'], default='store',
+                        help="store 从推文库按索引查询；files 读取 nitter_results 下的结果文件（默认 store）")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"推文库路径（默认 {DEFAULT_STORE_PATH}）")
+    parser.add_argument('--users', default=None, help="只处理这些用户，逗号分隔（仅 --input store）")
+    parser.add_argument('--workers', type=int, default=None, help="并行处理的进程数（默认为CPU核数）")
+    parser.add_argument('--days', type=int, default=7, help="只保留最近几天的推文（默认7天）")
+    parser.add_argument('--verbose', action='store_true', help="输出时间戳解析等调试日志")
+    parser.add_argument('--force', action='store_true', help="忽略处理清单，重新处理所有文件（已总结的推文仍会跳过，需配合 --no-dedup）")
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f"每个提示的 token 上限（默认{DEFAULT_TOKEN_BUDGET}）")
+    parser.add_argument('--max-prompts', type=int, default=DEFAULT_MAX_PROMPTS,
+                        help=f"每个文件最多生成几个提示，0 表示不限（默认{DEFAULT_MAX_PROMPTS}）")
+    parser.add_argument('--dup-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"相似度达到多少算近似重复并合并，0 表示不合并（默认{DEFAULT_THRESHOLD}）")
+    parser.add_argument('--no-dedup', action='store_true', help="不查推文索引，保留已经总结过的推文")
+    parser.add_argument('--metrics-file', default=METRICS_FILE,
+                        help=f"本次运行指标的 Prometheus 文本文件（默认 {METRICS_FILE}）")
+    args = parser.parse_args()
+    try:
+        prompt_room(args.token_budget)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.input == 'store' and not os.path.exists(args.store):
+        print(f"未找到推文库 {args.store}，改为读取 nitter_results 文件"
+              f"（可用 python tweet_store.py import nitter_results/*.json twitter_results/*.json 导入历史结果）")
+        args.input = 'files'
+    
+    if args.input == 'store':
+        users = [name.strip() for name in args.users.split(',') if name.strip()] if args.users else None
+        process_store(args.store, days=args.days, users=users, dedup=not args.no_dedup,
+                      token_budget=args.token_budget, max_prompts=args.max_prompts,
+                      dup_threshold=args.dup_threshold, metrics_file=args.metrics_file)
+    else:
+        process_nitter_results(max_workers=args.workers, days=args.days, force=args.force, dedup=not args.no_dedup,
+                               token_budget=args.token_budget, max_prompts=args.max_prompts,
+                               dup_threshold=args.dup_threshold, metrics_file=args.metrics_file)
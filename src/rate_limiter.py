@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import urlparse
+
+# Per-host limits: (initial rate, min rate, max rate) in requests per second
+HOST_LIMITS = {
+    'nitter.net': (0.5, 0.05, 2.0),
+    'x.com': (0.2, 0.02, 0.5),
+    'twitter.com': (0.2, 0.02, 0.5),
+    'techcrunch.com': (1.0, 0.1, 4.0),
+}
+DEFAULT_LIMITS = (0.5, 0.05, 2.0)
+
+# HTTP statuses that mean the host wants us to slow down
+THROTTLE_STATUSES = {429, 503}
+
+
+def host_of(url):
+    """Return the rate limiting key for a URL"""
+    host = urlparse(url).hostname or url
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to the host's responses (AIMD)"""
+
+    def __init__(self, rate, min_rate, max_rate, capacity=1.0,
+                 increase_step=0.05, decrease_factor=0.5):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a request may be sent, return the time waited"""
+        started = time.monotonic()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return time.monotonic() - started
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttled(self, retry_after=None):
+        """Multiplicative decrease, and pause the bucket for a while"""
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.tokens = 0
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self.blocked_until = max(self.blocked_until, now + pause)
+
+    def healthy(self):
+        """Additive increase after a good response"""
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+
+class HostRateLimiter:
+    """Shared rate limiter keyed by host, usable from all crawlers"""
+
+    def __init__(self, limits=None, jitter=0.3):
+        self.limits = dict(HOST_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.jitter = jitter
+        self.buckets = {}
+
+    def bucket(self, url):
+        host = host_of(url)
+        if host not in self.buckets:
+            rate, min_rate, max_rate = self.limits.get(host, DEFAULT_LIMITS)
+            self.buckets[host] = TokenBucket(rate, min_rate, max_rate)
+        return self.buckets[host]
+
+    async def acquire(self, url):
+        """Wait for the host's bucket, plus a little jitter so we don't look robotic"""
+        waited = await self.bucket(url).acquire()
+        if self.jitter:
+            delay = random.uniform(0, self.jitter)
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
+
+    def record(self, url, status=None, challenged=False, retry_after=None):
+        """Feed a response back into the host's rate"""
+        bucket = self.bucket(url)
+        if challenged or status in THROTTLE_STATUSES:
+            bucket.throttled(retry_after)
+            logging.warning(f"Throttling {host_of(url)} (status={status}, challenged={challenged}): "
+                            f"{bucket.rate:.2f} req/s")
+        elif status is None or status < 400:
+            bucket.healthy()
+
+    def rates(self):
+        """Current request rate per host"""
+        return {host: bucket.rate for host, bucket in self.buckets.items()}
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header given in seconds"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,95 @@
+import logging
+from collections import Counter
+from urllib.parse import urlparse
+
+# Rough transfer size of a request by resource type, used to estimate bytes saved
+ESTIMATED_BYTES = {
+    'image': 40_000,
+    'media': 500_000,
+    'font': 30_000,
+    'stylesheet': 20_000,
+    'script': 30_000,
+}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+# Analytics and ad hosts we never need
+TRACKER_DOMAINS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'facebook.net',
+    'scorecardresearch.com',
+    'hotjar.com',
+    'analytics.twitter.com',
+    'ads-twitter.com',
+    'ads-api.twitter.com',
+    'static.ads-twitter.com',
+]
+
+# Nitter is server-rendered, nothing but the document is needed
+NITTER_BLOCK_TYPES = ['image', 'media', 'font', 'stylesheet']
+# X needs its scripts and styles to render the timeline
+TWITTER_BLOCK_TYPES = ['image', 'media', 'font']
+
+
+def split_domains(value):
+    """Domains from a comma-separated command-line value"""
+    return [domain.strip().lower() for domain in (value or '').split(',') if domain.strip()]
+
+
+def domain_matches(host, domains):
+    """True if host is one of domains or a subdomain of one"""
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class ResourceBlocker:
+    """page.route handler that aborts requests by resource type and domain
+
+    allow_domains are never blocked, deny_domains are always blocked, and
+    anything else is blocked when its resource type is in block_types.
+    Documents are always allowed so navigation itself is never aborted.
+    """
+
+    def __init__(self, block_types=NITTER_BLOCK_TYPES, deny_domains=TRACKER_DOMAINS, allow_domains=()):
+        self.block_types = set(block_types)
+        self.deny_domains = list(deny_domains)
+        self.allow_domains = list(allow_domains)
+        self.blocked = Counter()
+        self.allowed = 0
+
+    def should_block(self, resource_type, url):
+        if resource_type == 'document':
+            return False
+        host = urlparse(url).hostname or ''
+        if domain_matches(host, self.allow_domains):
+            return False
+        if domain_matches(host, self.deny_domains):
+            return True
+        return resource_type in self.block_types
+
+    async def install(self, page):
+        """Route every request of the page through the policy"""
+        await page.route('**/*', self.handle)
+
+    async def uninstall(self, page):
+        await page.unroute('**/*', self.handle)
+
+    async def handle(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked[request.resource_type] += 1
+            await route.abort()
+        else:
+            self.allowed += 1
+            await route.continue_()
+
+    def bytes_saved(self):
+        """Estimated bytes not downloaded"""
+        return sum(ESTIMATED_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES) * count
+                   for resource_type, count in self.blocked.items())
+
+    def log_summary(self):
+        blocked = sum(self.blocked.values())
+        by_type = ', '.join(f"{resource_type}={count}" for resource_type, count in self.blocked.most_common())
+        logging.info(f"Blocked {blocked} of {blocked + self.allowed} requests "
+                     f"(~{self.bytes_saved() / 1_000_000:.1f} MB saved){': ' + by_type if by_type else ''}")
@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+
+
+class JsonlCheckpoint:
+    """Append-only JSONL file of crawl results, fsynced in batches"""
+
+    def __init__(self, path, resume=False, fsync_every=10):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.pending = 0
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if resume and not ends_with_newline(path):
+            # Terminate a line torn by a crash so the next record starts cleanly
+            self.file.write('\n')
+
+    def append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        self.pending += 1
+        if self.pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self.pending:
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+
+def ends_with_newline(path):
+    if os.path.getsize(path) == 0:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def read_checkpoint(path):
+    """Yield checkpoint records, skipping a line torn by a crash"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping truncated checkpoint line in {path}")
+
+
+def consolidate(checkpoint_path, output_path, order, keep=None):
+    """Stream the checkpoint into a JSON array in input order
+
+    Only byte offsets are held in memory; the last record per URL wins, so
+    a profile retried on resume replaces its earlier failure. Records for
+    which keep(record) is false are left out.
+    """
+    offsets = {}
+    with open(checkpoint_path, 'rb') as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                offsets[json.loads(line)['url']] = offset
+            except (json.JSONDecodeError, KeyError):
+                continue
+
+    ordered = [url for url in order if url in offsets]
+    known = set(order)
+    ordered += [url for url in offsets if url not in known]
+
+    summary = {'total': len(ordered), 'written': 0, 'failed_urls': []}
+    tmp_path = f"{output_path}.tmp"
+    with open(checkpoint_path, 'rb') as src, open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write('[')
+        for url in ordered:
+            src.seek(offsets[url])
+            record = json.loads(src.readline())
+            if not record.get('success'):
+                summary['failed_urls'].append(url)
+            if keep and not keep(record):
+                continue
+            out.write('\n' if summary['written'] == 0 else ',\n')
+            out.write(json.dumps(record, ensure_ascii=False, indent=2))
+            summary['written'] += 1
+        out.write('\n]\n')
+    os.replace(tmp_path, output_path)
+    return summary
+
+
+def write_failed_urls(path, failed_urls):
+    with open(path, 'w', encoding='utf-8') as f:
+        for url in failed_urls:
+            f.write(f"{url}\n")
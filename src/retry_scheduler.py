@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+
+class CrawlError(Exception):
+    """Base class for crawl failures with a known retry class"""
+    error_type = 'other'
+
+
+class RedirectError(CrawlError):
+    error_type = 'redirect'
+
+
+class ChallengeError(CrawlError):
+    error_type = 'challenge'
+
+
+class ExtractionError(CrawlError):
+    error_type = 'extraction'
+
+
+# error type -> (retries after the first attempt, base backoff in seconds)
+RETRY_POLICY = {
+    'timeout': (3, 5),
+    'redirect': (2, 10),
+    'challenge': (2, 30),
+    'extraction': (1, 5),
+    'other': (2, 5),
+    'cache_miss': (0, 0),  # replay mode: retrying cannot make the page appear
+}
+MAX_BACKOFF = 300
+
+
+def classify_error(error):
+    """Map an exception to one of the RETRY_POLICY error types"""
+    if isinstance(error, CrawlError):
+        return error.error_type
+    # Playwright's TimeoutError is not a subclass of the builtin one
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in type(error).__name__:
+        return 'timeout'
+    return 'other'
+
+
+def failed_result(url, error):
+    """Result dict for a failed profile"""
+    return {
+        'url': url,
+        'timestamp': datetime.now().isoformat(),
+        'error': str(error),
+        'error_type': classify_error(error),
+        'success': False
+    }
+
+
+def backoff_delay(error_type, attempt):
+    """Exponential backoff with jitter"""
+    _, base = RETRY_POLICY.get(error_type, RETRY_POLICY['other'])
+    return random.uniform(0, min(MAX_BACKOFF, base * 2 ** (attempt - 1))) + base / 2
+
+
+class RetryScheduler:
+    """Work queue of (index, url) items with delayed retries, a run deadline and a dead-letter list
+
+    Workers loop on get() until it returns None and report every attempt
+    with done(). Failed items wait out their backoff in a delay heap, so a
+    flaky profile never blocks the rest of the batch.
+    """
+
+    def __init__(self, items, deadline=None):
+        self.ready = deque(items)
+        self.delayed = []
+        self.seq = 0
+        self.attempts = Counter()
+        self.retries = Counter()
+        self.in_flight = 0
+        self.dead = []
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.cond = asyncio.Condition()
+
+    def expired(self, now=None):
+        return self.deadline is not None and (now or time.monotonic()) >= self.deadline
+
+    def _promote(self, now):
+        while self.delayed and self.delayed[0][0] <= now:
+            self.ready.append(heapq.heappop(self.delayed)[2])
+
+    async def get(self):
+        """Next item to crawl, or None once everything is finished or the deadline has passed"""
+        async with self.cond:
+            while True:
+                now = time.monotonic()
+                if self.expired(now):
+                    return None
+                self._promote(now)
+                if self.ready:
+                    self.in_flight += 1
+                    return self.ready.popleft()
+                if not self.delayed and self.in_flight == 0:
+                    return None
+                timeouts = []
+                if self.delayed:
+                    timeouts.append(self.delayed[0][0] - now)
+                if self.deadline is not None:
+                    timeouts.append(self.deadline - now)
+                try:
+                    await asyncio.wait_for(self.cond.wait(), min(timeouts) if timeouts else None)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def done(self, item, result):
+        """Report an attempt; returns True when the result is final and should be written"""
+        async with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+            url = item[1]
+            self.attempts[url] += 1
+            if result['success']:
+                return True
+
+            error_type = result.get('error_type', 'other')
+            max_retries, _ = RETRY_POLICY.get(error_type, RETRY_POLICY['other'])
+            if self.attempts[url] <= max_retries:
+                delay = backoff_delay(error_type, self.attempts[url])
+                if not self.expired(time.monotonic() + delay):
+                    self.retries[error_type] += 1
+                    self.seq += 1
+                    heapq.heappush(self.delayed, (time.monotonic() + delay, self.seq, item))
+                    logging.info(f"Retrying {url} in {delay:.0f}s ({error_type}, attempt {self.attempts[url]})")
+                    return False
+
+            self.dead.append(dead_letter(url, result, self.attempts[url]))
+            return True
+
+    async def requeue(self, item):
+        """Hand an item back without counting an attempt (e.g. its worker lost its browser)"""
+        async with self.cond:
+            self.in_flight -= 1
+            self.ready.appendleft(item)
+            self.cond.notify_all()
+
+    def finish(self, reason='run deadline reached'):
+        """Dead-letter whatever was left unprocessed (deadline, or no workers left)"""
+        left = list(self.ready) + [entry[2] for entry in self.delayed]
+        for _, url in left:
+            self.dead.append(dead_letter(url, {'error': reason, 'error_type': 'unprocessed'},
+                                         self.attempts[url]))
+        self.ready.clear()
+        self.delayed.clear()
+        if left:
+            logging.warning(f"{len(left)} profiles left unprocessed: {reason}")
+        return left
+
+
+def dead_letter(url, result, attempts):
+    return {
+        'url': url,
+        'error': result.get('error', ''),
+        'error_type': result.get('error_type', 'other'),
+        'attempts': attempts,
+        'failed_at': datetime.now().isoformat()
+    }
+
+
+def load_dead_letters(path):
+    """URLs that exhausted their retries last run, to be crawled first"""
+    if not os.path.exists(path):
+        return []
+    urls = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                urls.append(json.loads(line)['url'])
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return urls
+
+
+def write_dead_letters(path, entries):
+    """Replace the dead-letter file with this run's entries"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+def order_with_dead_letters(urls, dead_urls):
+    """(index, url) items with last run's dead letters first"""
+    dead = set(dead_urls)
+    items = list(enumerate(urls))
+    return [item for item in items if item[1] in dead] + [item for item in items if item[1] not in dead]
@@ -0,0 +1,245 @@
+import bisect
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+# Upper bounds (seconds) of the stage latency buckets; +Inf is implicit
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_PREFIX = 'crawl'
+
+METRIC_HELP = {
+    'stage_seconds': 'Time spent in each stage of a run',
+    'stage_failures_total': 'Stages that raised an exception',
+    'pages_total': 'Pages parsed, by how they were obtained',
+    'tweets_total': 'Tweets produced',
+    'bytes_total': 'Uncompressed response bytes downloaded',
+    'challenges_total': 'Anti-bot challenge interstitials seen',
+    'dom_fallbacks_total': 'X profiles read from the DOM because no timeline response was captured',
+    'files_total': 'Result files by processing outcome',
+    'prompts_total': 'Prompts written',
+    'errors_total': 'Failed attempts by error type',
+    'retries_total': 'Retries scheduled by error type',
+    'dead_letters_total': 'Items that exhausted their retries',
+    'profiles': 'Profiles in the last run',
+    'failed_profiles': 'Profiles that failed in the last run',
+    'run_seconds': 'Wall time of the last run',
+    'run_timestamp_seconds': 'Unix time the last run finished',
+}
+
+
+class Histogram:
+    """Bucket counts, sum, count and max of observed values, Prometheus style"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count', 'max')
+
+    def __init__(self, bounds=STAGE_BUCKETS):
+        self.bounds = bounds
+        # One slot per bound plus the +Inf bucket; made cumulative on export
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Estimated quantile, interpolating linearly inside its bucket like PromQL's histogram_quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(self.bounds):
+                    return self.max
+                lower = self.bounds[i - 1] if i else 0.0
+                return min(self.max, lower + (self.bounds[i] - lower) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class StageTimer:
+    """Context manager timing one stage into a RunMetrics histogram"""
+    __slots__ = ('metrics', 'stage', 'started', 'elapsed')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.elapsed = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.started
+        self.metrics.observe('stage_seconds', self.elapsed, stage=self.stage)
+        if exc_type is not None:
+            self.metrics.inc('stage_failures_total', stage=self.stage)
+        return False
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class RunMetrics:
+    """In-process counters, gauges and stage latency histograms for one run
+
+    Everything is plain dicts updated from a single event loop (or a single
+    worker process), so recording costs a dict lookup and, for stages, two
+    perf_counter calls. Worker processes return their RunMetrics to be merged.
+    At the end of a run the totals are written as a Prometheus text file (for
+    node_exporter's textfile collector) and as a JSON run summary.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        self.counters[(name, label_key(labels))] += value
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def stage(self, stage):
+        """with metrics.stage('goto'): ... records the block's duration"""
+        return StageTimer(self, stage)
+
+    def error(self, error_type):
+        self.inc('errors_total', error_type=error_type)
+
+    def merge(self, other):
+        for key, value in other.counters.items():
+            self.counters[key] += value
+        self.gauges.update(other.gauges)
+        for key, histogram in other.histograms.items():
+            if key in self.histograms:
+                self.histograms[key].merge(histogram)
+            else:
+                self.histograms[key] = histogram
+
+    def finish(self):
+        """Record the run's wall time and end timestamp"""
+        now = time.time()
+        self.set('run_seconds', now - self.started)
+        self.set('run_timestamp_seconds', now)
+
+    def prometheus(self):
+        """Prometheus text exposition of every series, labelled with the source"""
+        source = ('source', self.source)
+        lines = []
+        families = defaultdict(list)
+        for (name, labels), value in self.counters.items():
+            families[(name, 'counter')].append((labels, value))
+        for (name, labels), value in self.gauges.items():
+            families[(name, 'gauge')].append((labels, value))
+        for (name, labels), histogram in self.histograms.items():
+            families[(name, 'histogram')].append((labels, histogram))
+
+        for (name, kind), series in sorted(families.items()):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {full_name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in sorted(series, key=lambda item: item[0]):
+                labels = (source,) + labels
+                if kind != 'histogram':
+                    lines.append(f"{full_name}{format_labels(labels)} {format_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.bounds + ('+Inf',), value.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{full_name}_sum{format_labels(labels)} {format_number(value.sum)}")
+                lines.append(f"{full_name}_count{format_labels(labels)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """JSON-friendly totals: counters and gauges by label set, percentiles per stage"""
+        def by_labels(items):
+            grouped = defaultdict(dict)
+            for (name, labels), value in sorted(items):
+                key = ','.join(f'{label}={label_value}' for label, label_value in labels) or 'total'
+                grouped[name][key] = round(value, 6)
+            return dict(grouped)
+
+        stages = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name != 'stage_seconds':
+                continue
+            stages[dict(labels)['stage']] = {
+                'count': histogram.count,
+                'total_s': round(histogram.sum, 3),
+                'mean_ms': round(histogram.sum / histogram.count * 1000, 3),
+                'p50_ms': round(histogram.quantile(0.5) * 1000, 3),
+                'p95_ms': round(histogram.quantile(0.95) * 1000, 3),
+                'max_ms': round(histogram.max * 1000, 3),
+            }
+        return {
+            'source': self.source,
+            'started_at': datetime.fromtimestamp(self.started).isoformat(),
+            'counters': by_labels(self.counters.items()),
+            'gauges': by_labels(self.gauges.items()),
+            'stages': stages,
+        }
+
+    def write(self, prometheus_path=None, summary_path=None):
+        """Atomically write the Prometheus text file and/or the JSON summary"""
+        outputs = [(prometheus_path, self.prometheus), (summary_path,
+                   lambda: json.dumps(self.summary(), ensure_ascii=False, indent=2))]
+        for path, render in outputs:
+            if not path:
+                continue
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # The textfile collector must never see a half-written file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(render())
+            os.replace(tmp_path, path)
+
+    def log_summary(self):
+        for stage, summary in self.summary()['stages'].items():
+            logging.info(f"Stage {stage}: {summary['count']} calls, {summary['total_s']:.1f}s total, "
+                         f"p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms")
@@ -1,56 +1,125 @@
 from crawl4ai import AsyncWebCrawler
 import json
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import os
 import logging
 import asyncio
+import argparse
+import re
+from contextlib import nullcontext
 from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
+from techcrunch_parse import LINK_PARSERS, parse_article_links
+from rate_limiter import HostRateLimiter
+from near_dup import collapse_articles
+from page_cache import PageCache, DEFAULT_CACHE_DIR
 
 # 设置日志
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+ARTICLE_DATE_RE = re.compile(r'^https://techcrunch\.com/(\d{4})/(\d{2})/(\d{2})/')
+
+def article_date(url: str) -> Optional[date]:
+    """从文章链接里的 /YYYY/MM/DD/ 取发布日期"""
+    match = ARTICLE_DATE_RE.match(url)
+    if not match:
+        return None
+    try:
+        return date(*map(int, match.groups()))
+    except ValueError:
+        return None
+
 class TechCrunchCrawler:
-    def __init__(self):
-        self.base_url = "https://techcrunch.com/latest/"
-        
-    async def crawl(self, num_pages: int = 1) -> List[Dict]:
-        """只爬取TechCrunch文章链接"""
+    def __init__(self, rate_limiter=None, base_url: str = "https://techcrunch.com/latest/", concurrency: int = 4,
+                 parser: str = 'regex', page_cache: Optional[PageCache] = None):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        # 同时抓取的列表页数
+        self.concurrency = concurrency
+        # 列表页解析器，见 LINK_PARSERS
+        self.parser = parser
+        # 列表页缓存；重放模式下只从缓存读取
+        self.page_cache = page_cache
+    
+    def page_url(self, page: int) -> str:
+        """第 page 页列表的地址，第一页就是 base_url"""
+        return self.base_url if page == 1 else f"{self.base_url}page/{page}/"
+    
+    async def fetch_page(self, crawler, page: int) -> Optional[List[Dict]]:
+        """抓取并解析一页列表，失败时返回 None"""
+        url = self.page_url(page)
+        if self.page_cache:
+            html = self.page_cache.get_text(url, 'techcrunch')
+            if html is not None:
+                articles = parse_article_links(html, self.parser)
+                logger.info(f"第 {page} 页来自缓存，获取到 {len(articles)} 个文章链接")
+                return articles
+            if self.page_cache.replay:
+                logger.warning(f"缓存中没有页面: {url}")
+                return None
+        try:
+            await self.rate_limiter.acquire(url)
+            result = await crawler.arun(
+                url=url,
+                extract_text=True,
+                extract_metadata=True,
+                javascript=True
+            )
+            self.rate_limiter.record(url, getattr(result, 'status_code', None))
+            if not result or not result.html:
+                logger.warning(f"页面没有内容: {url}")
+                return None
+            if self.page_cache:
+                self.page_cache.put(url, 'techcrunch', result.html, getattr(result, 'status_code', None) or 200)
+            articles = parse_article_links(result.html, self.parser)
+            logger.info(f"第 {page} 页获取到 {len(articles)} 个文章链接")
+            return articles
+        except Exception as e:
+            logger.error(f"爬取页面出错 {url}: {str(e)}")
+            return None
+    
+    async def crawl(self, num_pages: int = 1, since: Optional[date] = None) -> List[Dict]:
+        """只爬取TechCrunch文章链接
+
+        列表页按 concurrency 一批并发抓取；设置了 since 时，遇到第一页
+        所有文章都早于 since 就停止，不再抓后面的页。
+        """
         articles = []
+        seen_urls = set()
         
-        async with AsyncWebCrawler() as crawler:
-            for page in range(1, num_pages + 1):
-                url = self.base_url
-                try:
-                    result = await crawler.arun(
-                        url=url,
-                        extract_text=True,
-                        extract_metadata=True,
-                        javascript=True
-                    )
-                    
-                    if result and result.html:
-                        soup = BeautifulSoup(result.html, 'html.parser')
-                        # 查找所有文章链接
-                        for link in soup.find_all('a', class_='loop-card__title-link', href=True):
-                            href = link.get('href', '').strip(':')
-                            if href and href.startswith('https://techcrunch.com/20'):
-                                articles.append({
-                                    'url': href,
-                                    'title': link.get_text(strip=True),
-                                    'crawl_date': datetime.now().isoformat()
-                                })
-                                logger.info(f"成功获取文章链接: {href}")
-                    
-                except Exception as e:
-                    logger.error(f"爬取页面出错 {url}: {str(e)}")
-                    continue
-                    
-        return articles
+        # 重放模式不启动浏览器
+        replay = self.page_cache is not None and self.page_cache.replay
+        async with (nullcontext() if replay else AsyncWebCrawler()) as crawler:
+            for first in range(1, num_pages + 1, self.concurrency):
+                pages = range(first, min(first + self.concurrency, num_pages + 1))
+                results = await asyncio.gather(*(self.fetch_page(crawler, page) for page in pages))
+                
+                reached_cutoff = False
+                for page, page_articles in zip(pages, results):
+                    if page_articles is None:
+                        continue
+                    dates = [article_date(article['url']) for article in page_articles]
+                    if since and page_articles and all(d and d < since for d in dates):
+                        logger.info(f"第 {page} 页的文章都早于 {since}，停止翻页")
+                        reached_cutoff = True
+                        break
+                    for article, published in zip(page_articles, dates):
+                        if article['url'] in seen_urls or (since and published and published < since):
+                            continue
+                        seen_urls.add(article['url'])
+                        articles.append(article)
+                if reached_cutoff:
+                    break
+        
+        logger.info(f"共获取 {len(articles)} 个不重复的文章链接")
+        # 合并标题几乎相同的文章（同一事件的多篇报道）
+        collapsed = collapse_articles(articles)
+        if len(collapsed) < len(articles):
+            logger.info(f"合并了 {len(articles) - len(collapsed)} 篇标题近似重复的文章")
+        return collapsed
 
 def save_articles(articles: List[Dict], filename: Optional[str] = None):
     """保存文章链接和提示词到JSON文件"""
@@ -95,6 +164,27 @@ def save_articles(articles: List[Dict], filename: Optional[str] = None):
     logger.info(f"保存了 {len(articles)} 个文章链接到 {filename}")
 
 if __name__ == "__main__":
-    crawler = TechCrunchCrawler()
-    articles = asyncio.run(crawler.crawl(num_pages=1))  # 爬取前2页
-    save_articles(articles)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="抓取 TechCrunch 最新文章链接")
+    parser.add_argument('--pages', type=int, default=2, help="最多抓取几页列表（默认2页）")
+    parser.add_argument('--days', type=int, default=None, help="只保留最近几天的文章，更早的页不再抓取")
+    parser.add_argument('--concurrency', type=int, default=4, help="同时抓取的列表页数（默认4）")
+    parser.add_argument('--parser', choices=sorted(LINK_PARSERS), default='regex', help="列表页解析器（默认regex）")
+    parser.add_argument('--base-url', default="https://techcrunch.com/latest/", help="列表页地址")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f"页面缓存目录（默认 {DEFAULT_CACHE_DIR}）")
+    parser.add_argument('--no-cache', action='store_true', help="不读写页面缓存")
+    parser.add_argument('--use-cache', action='store_true', help="缓存有效期（15 分钟）内的列表页直接读缓存，不重新抓取（默认只写缓存）")
+    parser.add_argument('--replay', action='store_true', help="只从页面缓存重放，不访问网络")
+    args = parser.parse_args()
+    if args.no_cache and (args.replay or args.use_cache):
+        parser.error("--replay 和 --use-cache 需要页面缓存")
+    
+    since = date.today() - timedelta(days=args.days) if args.days else None
+    # 正常抓取只写缓存，除非指定 --use-cache
+    page_cache = None if args.no_cache else PageCache(args.cache_dir, replay=args.replay, read=args.use_cache)
+    crawler = TechCrunchCrawler(base_url=args.base_url, concurrency=args.concurrency, parser=args.parser,
+                                page_cache=page_cache)
+    articles = asyncio.run(crawler.crawl(num_pages=args.pages, since=since))
+    save_articles(articles)
+    if page_cache:
+        page_cache.log_summary()
+        page_cache.close()
@@ -0,0 +1,77 @@
+import re
+from datetime import datetime
+from html import unescape
+
+from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+
+TITLE_LINK_CLASS = 'loop-card__title-link'
+ARTICLE_PREFIX = 'https://techcrunch.com/20'
+
+# Only the card title anchors are scanned; no DOM tree is built
+TITLE_LINK_RE = re.compile(
+    rb'<a\s(?=[^>]*\bclass\s*=\s*["\'][^"\']*\bloop-card__title-link\b)([^>]*)>(.*?)</a\s*>', re.S | re.I)
+HREF_RE = re.compile(rb'\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.I)
+TAG_RE = re.compile(rb'<[^>]*>')
+
+
+def make_article(href, title):
+    """Article dict for a title link, or None if it does not point to an article"""
+    href = href.strip().strip(':')
+    if not href.startswith(ARTICLE_PREFIX):
+        return None
+    return {
+        'url': href,
+        'title': title,
+        'crawl_date': datetime.now().isoformat()
+    }
+
+
+def parse_links_regex(html):
+    """Scan the raw bytes for title anchors (default: fastest, smallest footprint)"""
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    articles = []
+    for match in TITLE_LINK_RE.finditer(html):
+        href_match = HREF_RE.search(match.group(1))
+        if not href_match:
+            continue
+        href = unescape((href_match.group(1) or href_match.group(2)).decode('utf-8', 'replace'))
+        title = unescape(TAG_RE.sub(b'', match.group(2)).decode('utf-8', 'replace')).strip()
+        article = make_article(href, title)
+        if article:
+            articles.append(article)
+    return articles
+
+
+def parse_links_selectolax(html):
+    """Parse with lexbor (C) and query the anchors with a CSS selector"""
+    articles = []
+    for link in LexborHTMLParser(html).css(f'a.{TITLE_LINK_CLASS}'):
+        article = make_article(link.attributes.get('href') or '', link.text(strip=True))
+        if article:
+            articles.append(article)
+    return articles
+
+
+def parse_links_bs4(html):
+    """The original BeautifulSoup extraction, kept as a reference"""
+    articles = []
+    soup = BeautifulSoup(html, 'html.parser')
+    for link in soup.find_all('a', class_=TITLE_LINK_CLASS, href=True):
+        article = make_article(link.get('href', ''), link.get_text(strip=True))
+        if article:
+            articles.append(article)
+    return articles
+
+
+LINK_PARSERS = {
+    'regex': parse_links_regex,
+    'selectolax': parse_links_selectolax,
+    'bs4': parse_links_bs4,
+}
+
+
+def parse_article_links(html, parser='regex'):
+    """Article links and titles from a listing page (str or bytes)"""
+    return LINK_PARSERS[parser](html)
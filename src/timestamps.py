@@ -0,0 +1,40 @@
+import calendar
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+NITTER_TIMESTAMP_RE = re.compile(r'^([A-Z][a-z]{2}) (\d{1,2}), (\d{4}) · (\d{1,2}):(\d{2}) ([AP]M) UTC$')
+# 不用 calendar.month_abbr，它随系统 locale 变化
+MONTHS = {name: i for i, name in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], start=1)}
+
+@lru_cache(maxsize=65536)
+def parse_timestamp_epoch(timestamp_str):
+    """把 nitter（"Jun 10, 2025 · 10:58 PM UTC"）或 ISO 格式的时间戳解析为 UTC 秒数，失败返回 None"""
+    match = NITTER_TIMESTAMP_RE.match(timestamp_str)
+    if match:
+        month, day, year, hour, minute, meridiem = match.groups()
+        hour = int(hour) % 12 + (12 if meridiem == 'PM' else 0)
+        return calendar.timegm((int(year), MONTHS[month], int(day), hour, int(minute), 0))
+    
+    try:
+        parsed = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+    except ValueError as e:
+        logger.debug(f'Error parsing timestamp {timestamp_str}: {e}')
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def recency_cutoff(days=7):
+    """最近 days 天的起点（UTC 秒数），每次运行只计算一次"""
+    return int(time.time()) - days * 86400
+
+def recent_mask(timestamps, cutoff):
+    """批量判断一组时间戳是否在 cutoff 之后；无法解析的时间默认包含"""
+    epochs = [parse_timestamp_epoch(ts) if ts else None for ts in timestamps]
+    return [epoch is None or epoch >= cutoff for epoch in epochs]
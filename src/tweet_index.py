@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import math
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+from crawl_state import tweet_id_from_url
+
+DEFAULT_INDEX_PATH = 'tweet_index.db'
+
+# Processing stages a tweet can be marked with
+STAGES = ('crawled', 'summarized')
+
+
+def canonical_tweet_id(tweet):
+    """Status ID shared by the Nitter and X copies of a tweet, as an int"""
+    tweet_id = tweet.get('id') or tweet_id_from_url(tweet.get('url'))
+    return int(tweet_id) if tweet_id else None
+
+
+class BloomFilter:
+    """In-memory Bloom filter over integer IDs (double hashing on blake2b)"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.to_bytes(8, 'big'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TweetIndex:
+    """Persistent set of tweet IDs per stage: SQLite on disk, a Bloom filter in front
+
+    A Bloom miss answers "never seen" without touching SQLite; only
+    possible hits are confirmed with a primary-key lookup.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS tweets (
+                tweet_id INTEGER PRIMARY KEY,
+                crawled_at TEXT,
+                summarized_at TEXT
+            )
+        ''')
+        self.blooms = {}
+        # IDs kept by filter_new this run, marked on commit() once results are on disk
+        self.pending = {stage: set() for stage in STAGES}
+
+    def _bloom(self, stage):
+        """Load the stage's Bloom filter on first use, sized with headroom for growth"""
+        bloom = self.blooms.get(stage)
+        if bloom is None or bloom.count >= bloom.capacity:
+            column = self._column(stage)
+            (count,) = self.conn.execute(f'SELECT COUNT(*) FROM tweets WHERE {column} IS NOT NULL').fetchone()
+            bloom = BloomFilter(capacity=max(100_000, count * 2))
+            for (tweet_id,) in self.conn.execute(f'SELECT tweet_id FROM tweets WHERE {column} IS NOT NULL'):
+                bloom.add(tweet_id)
+            self.blooms[stage] = bloom
+            logging.info(f"Loaded {count} {stage} tweet IDs from {self.path}")
+        return bloom
+
+    @staticmethod
+    def _column(stage):
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        return f'{stage}_at'
+
+    def seen(self, tweet_id, stage='crawled'):
+        if tweet_id not in self._bloom(stage):
+            return False
+        row = self.conn.execute(f'SELECT 1 FROM tweets WHERE tweet_id = ? AND {self._column(stage)} IS NOT NULL',
+                                (tweet_id,)).fetchone()
+        return row is not None
+
+    def claim(self, tweet_ids, stage='summarized'):
+        """Atomically mark IDs, returning those not marked before (safe across processes)"""
+        column = self._column(stage)
+        now = datetime.now().isoformat()
+        claimed = set()
+        # Inside locked() the claim joins the caller's transaction
+        own_transaction = not self.conn.in_transaction
+        if own_transaction:
+            self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            for tweet_id in tweet_ids:
+                cursor = self.conn.execute(f'''
+                    INSERT INTO tweets (tweet_id, {column}) VALUES (?, ?)
+                    ON CONFLICT (tweet_id) DO UPDATE SET {column} = excluded.{column} WHERE {column} IS NULL
+                ''', (tweet_id, now))
+                if cursor.rowcount:
+                    claimed.add(tweet_id)
+            if own_transaction:
+                self.conn.execute('COMMIT')
+        except Exception:
+            if own_transaction:
+                self.conn.execute('ROLLBACK')
+            raise
+        bloom = self.blooms.get(stage)
+        if bloom is not None:
+            for tweet_id in claimed:
+                bloom.add(tweet_id)
+        return claimed
+
+    def filter_new(self, tweets, stage='crawled'):
+        """Drop tweets already marked for the stage or kept earlier this run; tweets without an ID are kept"""
+        pending = self.pending[stage]
+        new_tweets = []
+        for tweet in tweets:
+            tweet_id = canonical_tweet_id(tweet)
+            if tweet_id is not None:
+                if tweet_id in pending or self.seen(tweet_id, stage):
+                    continue
+                pending.add(tweet_id)
+            new_tweets.append(tweet)
+        return new_tweets
+
+    def unseen(self, tweets, stage='summarized'):
+        """Drop tweets already marked for the stage and repeats within the batch, without marking anything"""
+        kept_ids = set()
+        new_tweets = []
+        for tweet in tweets:
+            tweet_id = canonical_tweet_id(tweet)
+            if tweet_id is not None:
+                if tweet_id in kept_ids or self.seen(tweet_id, stage):
+                    continue
+                kept_ids.add(tweet_id)
+            new_tweets.append(tweet)
+        return new_tweets
+
+    @contextmanager
+    def locked(self):
+        """Hold the write lock across a check, some work and the claim that records it
+
+        Other processes wait at their own BEGIN IMMEDIATE, so a check with
+        unseen() cannot race their claims, and claims made inside are rolled
+        back if the work fails.
+        """
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            # Bloom bits of rolled-back claims would only cost extra lookups, but reload for exact counts
+            self.blooms.clear()
+            raise
+        self.conn.execute('COMMIT')
+
+    def commit(self, stage='crawled'):
+        """Mark everything kept by filter_new as done for the stage"""
+        marked = self.claim(sorted(self.pending[stage]), stage)
+        self.pending[stage].clear()
+        return len(marked)
+
+    def close(self):
+        self.conn.close()
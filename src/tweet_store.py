@@ -0,0 +1,205 @@
+"""Crawled tweets from every source in one indexed SQLite database
+
+Usage: python tweet_store.py import nitter_results/*.json twitter_results/*.json
+       python tweet_store.py query [--users sama,openai] [--days 7] [--limit 20]
+       python tweet_store.py stats
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import ijson
+
+from crawl_state import profile_key
+from timestamps import parse_timestamp_epoch, recency_cutoff
+from tweet_index import canonical_tweet_id
+
+DEFAULT_STORE_PATH = 'tweets.db'
+
+# Rows per INSERT transaction
+BATCH_SIZE = 1000
+
+
+def crawl_epoch(result):
+    """When a result was crawled; crawlers write local-time ISO timestamps"""
+    try:
+        return int(datetime.fromisoformat(result['timestamp']).timestamp())
+    except (KeyError, TypeError, ValueError):
+        return int(time.time())
+
+
+def tweet_rows(results, source):
+    """One row per tweet with a status ID in successful results"""
+    for result in results:
+        if not result.get('success'):
+            continue
+        profile_url = result.get('url', '')
+        username = profile_key(profile_url) if profile_url else (result.get('username') or '').lstrip('@').lower()
+        crawled_at = crawl_epoch(result)
+        for tweet in result.get('tweets') or []:
+            tweet_id = canonical_tweet_id(tweet)
+            if tweet_id is None:
+                continue
+            timestamp = tweet.get('timestamp')
+            posted_at = parse_timestamp_epoch(timestamp) if timestamp else None
+            # A tweet is no older than its crawl, and a non-NULL posted_at keeps recency an index range scan
+            yield (tweet_id, username, result.get('username') or '', profile_url, source,
+                   crawled_at if posted_at is None else posted_at, crawled_at,
+                   json.dumps(tweet, ensure_ascii=False))
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TweetStore:
+    """Tweets keyed by status ID, indexed by (username, posted_at) and posted_at
+
+    Crawling the same tweet again, from either source, updates its row with
+    the newer copy, so importing a result file twice is harmless. posted_at
+    is the tweet's epoch, or its crawl time when the timestamp cannot be
+    parsed, so such tweets stay in recent windows like they do in recent_mask.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS tweets (
+                tweet_id INTEGER PRIMARY KEY,
+                username TEXT NOT NULL,
+                screen_name TEXT,
+                profile_url TEXT,
+                source TEXT NOT NULL,
+                posted_at INTEGER NOT NULL,
+                crawled_at INTEGER NOT NULL,
+                data TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tweets_username_posted_at ON tweets (username, posted_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tweets_posted_at ON tweets (posted_at)')
+
+    def add_results(self, results, source, batch_size=BATCH_SIZE):
+        """Upsert the tweets of crawl results in batched transactions, returns the number of tweets"""
+        written = 0
+        for batch in batches(tweet_rows(results, source), batch_size):
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany('''
+                    INSERT INTO tweets (tweet_id, username, screen_name, profile_url, source, posted_at,
+                                        crawled_at, data)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (tweet_id) DO UPDATE SET username = excluded.username,
+                        screen_name = excluded.screen_name, profile_url = excluded.profile_url,
+                        source = excluded.source, posted_at = excluded.posted_at,
+                        crawled_at = excluded.crawled_at, data = excluded.data
+                    WHERE excluded.crawled_at >= tweets.crawled_at
+                ''', batch)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            written += len(batch)
+        return written
+
+    def import_file(self, path, source=None):
+        """Stream a crawler's JSON result file into the store"""
+        if source is None:
+            source = 'twitter' if 'twitter' in os.path.basename(path) else 'nitter'
+        with open(path, 'rb') as f:
+            return self.add_results(ijson.items(f, 'item', use_float=True), source)
+
+    def query(self, usernames=None, since=None, until=None, source=None, limit=None):
+        """Yield (profile, tweet) pairs, newest first
+
+        usernames are matched case-insensitively without a leading '@';
+        since/until bound posted_at in epoch seconds.
+        """
+        clauses = []
+        params = []
+        if usernames:
+            names = [name.lstrip('@').lower() for name in usernames]
+            clauses.append(f"username IN ({','.join('?' * len(names))})")
+            params.extend(names)
+        if since is not None:
+            clauses.append('posted_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('posted_at < ?')
+            params.append(until)
+        if source:
+            clauses.append('source = ?')
+            params.append(source)
+        sql = 'SELECT screen_name, profile_url, source, data FROM tweets'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY posted_at DESC'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        for screen_name, profile_url, source, data in self.conn.execute(sql, params):
+            yield {'url': profile_url, 'username': screen_name, 'source': source}, json.loads(data)
+
+    def stats(self):
+        rows = self.conn.execute('''
+            SELECT source, COUNT(*), COUNT(DISTINCT username), MIN(posted_at), MAX(posted_at)
+            FROM tweets GROUP BY source
+        ''').fetchall()
+        return {source: {'tweets': tweets, 'users': users,
+                         'oldest': datetime.fromtimestamp(oldest).isoformat(),
+                         'newest': datetime.fromtimestamp(newest).isoformat()}
+                for source, tweets, users, oldest, newest in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"database path (default: {DEFAULT_STORE_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help="import crawler JSON result files (safe to repeat)")
+    importer.add_argument('paths', nargs='+')
+    importer.add_argument('--source', choices=['nitter', 'twitter'],
+                          help="source of every file (default: guessed from each file name)")
+    query = commands.add_parser('query', help="print matching tweets as JSON lines")
+    query.add_argument('--users', help="comma-separated usernames")
+    query.add_argument('--days', type=int, help="only tweets from the last N days")
+    query.add_argument('--source', choices=['nitter', 'twitter'])
+    query.add_argument('--limit', type=int)
+    commands.add_parser('stats', help="tweet counts and time range per source")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = TweetStore(args.store)
+    try:
+        if args.command == 'import':
+            for path in args.paths:
+                logging.info(f"Imported {store.import_file(path, args.source)} tweets from {path}")
+        elif args.command == 'query':
+            users = [name.strip() for name in args.users.split(',') if name.strip()] if args.users else None
+            since = recency_cutoff(args.days) if args.days else None
+            for profile, tweet in store.query(users, since=since, source=args.source, limit=args.limit):
+                print(json.dumps({**tweet, 'username': profile['username'], 'source': profile['source']},
+                                 ensure_ascii=False))
+        else:
+            print(json.dumps(store.stats(), ensure_ascii=False, indent=2))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,17 @@ import os
 import aiohttp
 import aiofiles
 from urllib.parse import urlparse
+import argparse
+from rate_limiter import HostRateLimiter, parse_retry_after
+from resource_blocker import ResourceBlocker, TWITTER_BLOCK_TYPES, TRACKER_DOMAINS, split_domains
+from crawl_state import CrawlStateStore, tweet_id_from_url, is_seen
+from tweet_index import TweetIndex
+from tweet_store import TweetStore, DEFAULT_STORE_PATH
+from page_cache import PageCache, CacheMissError, DEFAULT_CACHE_DIR
+from run_metrics import RunMetrics
+from result_writer import JsonlCheckpoint, read_checkpoint, consolidate, write_failed_urls
+from retry_scheduler import (RetryScheduler, failed_result, load_dead_letters, write_dead_letters,
+                             order_with_dead_letters)
 
 # Set up logging
 logging.basicConfig(
@@ -21,50 +32,220 @@ logging.basicConfig(
     ]
 )
 
-class TwitterCrawler:
+# 每个主页最多取前4条（与DOM展示顺序一致，置顶在最前）
+MAX_TIMELINE_ITEMS = 4
+
+# 用户时间线的 GraphQL 操作名
+TIMELINE_OPERATIONS = {'UserTweets', 'UserTweetsAndReplies'}
+
+# 一次性提取所有推文元素的链接、时间、文本、互动数据和置顶、转推标记
+TWEETS_EXTRACT_JS = '''() => Array.from(document.querySelectorAll('article[data-testid="tweet"]')).map((article) => {
+    const link = article.querySelector('a[href*="/status/"]');
+    const time = article.querySelector('time');
+    const text = article.querySelector('div[data-testid="tweetText"]');
+    const context = article.querySelector('[data-testid="socialContext"]');
+    const metrics = {};
+    for (const name of ['retweet', 'reply', 'like']) {
+        const el = article.querySelector(`[data-testid="${name}"]`);
+        if (el) {
+            // aria-label 带完整数字（如 "1234 Likes. Like"），文本是缩写（如 "1.2K"）
+            const label = (el.getAttribute('aria-label') || '').match(/^([\\d,]+)/);
+            metrics[name] = label ? label[1] : el.innerText;
+        }
+    }
+    return {
+        href: link ? link.getAttribute('href') : '',
+        datetime: time ? time.getAttribute('datetime') : '',
+        text: text ? text.innerText : '',
+        pinned: !!context && /pinned|置顶/i.test(context.innerText),
+        // 转推的链接指向原推文，ID 比主页上更新的推文小
+        is_retweet: !!context && /reposted|retweeted|转帖|转推|转发/i.test(context.innerText),
+        metrics: metrics
+    };
+})'''
+
+def parse_count(count_text):
+    """解析 "1,234"、"1.2K"、"3M" 这样的数字"""
+    text = (count_text or '').strip().replace(',', '').upper()
+    multiplier = 1
+    if text[-1:] in ('K', 'M', 'B'):
+        multiplier = {'K': 1_000, 'M': 1_000_000, 'B': 1_000_000_000}[text[-1]]
+        text = text[:-1]
+    try:
+        return round(float(text) * multiplier)
+    except ValueError:
+        return 0
+
+def _timeline_instructions(payload):
+    user = ((payload.get('data') or {}).get('user') or {}).get('result') or {}
+    for key in ('timeline_v2', 'timeline'):
+        timeline = (user.get(key) or {}).get('timeline') or {}
+        if 'instructions' in timeline:
+            return timeline['instructions']
+    return []
+
+def _entry_tweet_results(entry):
+    """一个时间线条目里的所有推文结果（会话模块可能包含多条）"""
+    content = entry.get('content') or {}
+    if 'itemContent' in content:
+        yield (content['itemContent'].get('tweet_results') or {}).get('result')
+    for module_item in content.get('items') or []:
+        item_content = (module_item.get('item') or {}).get('itemContent') or {}
+        yield (item_content.get('tweet_results') or {}).get('result')
+
+def tweet_from_result(result, pinned=False):
+    """把 GraphQL 推文结果转换成推文记录"""
+    if not result:
+        return None
+    if result.get('__typename') == 'TweetWithVisibilityResults':
+        result = result.get('tweet') or {}
+    # 转推取原推文，和页面上显示的一致；ID 也是原推文的，标记出来以免当成时间线顺序
+    retweeted = ((result.get('legacy') or {}).get('retweeted_status_result') or {}).get('result')
+    if retweeted:
+        tweet = tweet_from_result(retweeted, pinned)
+        if tweet:
+            tweet['is_retweet'] = True
+        return tweet
+    
+    legacy = result.get('legacy')
+    tweet_id = result.get('rest_id')
+    if not legacy or not tweet_id:
+        return None
+    
+    user = ((result.get('core') or {}).get('user_results') or {}).get('result') or {}
+    screen_name = (user.get('core') or {}).get('screen_name') or (user.get('legacy') or {}).get('screen_name') or 'i'
+    note = (((result.get('note_tweet') or {}).get('note_tweet_results') or {}).get('result') or {}).get('text')
+    created_at = datetime.strptime(legacy['created_at'], '%a %b %d %H:%M:%S %z %Y')
+    
+    return {
+        'id': tweet_id,
+        'text': note or legacy.get('full_text', ''),
+        'timestamp': created_at.isoformat(),
+        'url': f"https://twitter.com/{screen_name}/status/{tweet_id}",
+        'metrics': {
+            'retweet': legacy.get('retweet_count', 0),
+            'reply': legacy.get('reply_count', 0),
+            'like': legacy.get('favorite_count', 0)
+        },
+        'pinned': pinned,
+        'is_retweet': False
+    }
+
+def parse_timeline_responses(payloads):
+    """从时间线接口响应中按页面顺序（置顶在前）构建推文记录"""
+    pinned, timeline = [], []
+    for payload in payloads:
+        for instruction in _timeline_instructions(payload):
+            if instruction.get('type') == 'TimelinePinEntry':
+                entries, target, is_pinned = [instruction.get('entry') or {}], pinned, True
+            elif instruction.get('type') == 'TimelineAddEntries':
+                entries, target, is_pinned = instruction.get('entries') or [], timeline, False
+            else:
+                continue
+            for entry in entries:
+                for result in _entry_tweet_results(entry):
+                    try:
+                        tweet = tweet_from_result(result, is_pinned)
+                    except (KeyError, ValueError) as e:
+                        logging.warning(f"Skipping malformed timeline entry: {str(e)}")
+                        continue
+                    if tweet and tweet['text']:
+                        target.append(tweet)
+    
+    tweets, seen = [], set()
+    for tweet in pinned + timeline:
+        if tweet['id'] not in seen:
+            seen.add(tweet['id'])
+            tweets.append(tweet)
+    return tweets
+
+def take_new_tweets(tweets, high_water):
+    """截到第一条已经抓过的推文为止（置顶推文和转推的 ID 不按时间线排序，只跳过）"""
+    new_tweets = []
+    for tweet in tweets:
+        if is_seen(tweet['id'], high_water):
+            if tweet.get('pinned') or tweet.get('is_retweet'):
+                continue
+            break
+        new_tweets.append(tweet)
+    return new_tweets
+
+class TimelineCapture:
+    """监听页面响应，收集用户时间线的 GraphQL JSON"""
+    
     def __init__(self):
+        self.payloads = []
+        # 接口响应的总字节数
+        self.bytes = 0
+        self.tasks = []
+        self.ready = asyncio.Event()
+    
+    def on_response(self, response):
+        operation = urlparse(response.url).path.rsplit('/', 1)[-1]
+        if '/i/api/graphql/' in response.url and operation in TIMELINE_OPERATIONS:
+            self.tasks.append(asyncio.ensure_future(self._read(response)))
+    
+    async def _read(self, response):
+        try:
+            body = await response.body()
+            self.bytes += len(body)
+            self.payloads.append(json.loads(body))
+            self.ready.set()
+        except Exception as e:
+            logging.warning(f"Failed to read timeline response: {str(e)}")
+    
+    async def drain(self):
+        """等待所有进行中的响应读取完成"""
+        if self.tasks:
+            await asyncio.gather(*self.tasks)
+
+# 每个主页最新推文的记录，用于增量抓取
+TWITTER_STATE_FILE = 'twitter_results/crawl_state.json'
+# 每个主页抓完后追加写入的检查点
+TWITTER_CHECKPOINT_FILE = 'twitter_results/twitter_results_checkpoint.jsonl'
+# 重试用尽的主页，下次运行优先抓取
+TWITTER_DEAD_LETTER_FILE = 'twitter_results/dead_letter.jsonl'
+# 每次运行结束时重写的 Prometheus 文本文件；JSON 运行摘要和结果文件放在一起
+TWITTER_METRICS_FILE = 'twitter_results/metrics.prom'
+
+class TwitterCrawler:
+    def __init__(self, rate_limiter=None, state_store=None, tweet_index=None, page_cache=None, run_metrics=None):
         self.context = None
         self.page = None
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.state_store = state_store
+        # 跨运行的已抓取推文索引，与 Nitter 爬虫共用
+        self.tweet_index = tweet_index
+        # 时间线接口响应的缓存；重放模式下只从缓存读取
+        self.page_cache = page_cache
+        # 各阶段耗时和计数，同一次运行的所有 worker 共用
+        self.run_metrics = run_metrics or RunMetrics('twitter')
     
     async def random_delay(self, min_seconds=1, max_seconds=3):
         """随机延迟，模拟人类行为"""
         delay = random.uniform(min_seconds, max_seconds)
-        await asyncio.sleep(delay)
+        with self.run_metrics.stage('sleep'):
+            await asyncio.sleep(delay)
 
     async def crawl_profile(self, url):
         """爬取指定用户的推文"""
         try:
             logging.info(f"Starting to crawl: {url}")
+            high_water = self.state_store.high_water(url) if self.state_store else None
             
-            # 访问用户主页
-            try:
-                await self.page.goto(url)
-                # 增加等待时间到5-8秒
-                await self.random_delay(5, 8)
-                
-                # 等待页面加载完成
-                try:
-                    # 等待主要推文区域加载
-                    await self.page.wait_for_selector('article[data-testid="tweet"]', timeout=10000)
-                    logging.info("Tweet area loaded successfully")
-                except Exception as e:
-                    logging.warning(f"Timeout waiting for tweet area: {str(e)}")
-                    # 继续执行，因为页面可能已经部分加载
-                
-            except Exception as e:
-                logging.warning(f"Page navigation warning: {str(e)}")
-                # 继续执行，因为页面可能已经加载
-            
-            # 获取用户信息
-            try:
-                profile_name = await self.page.query_selector('div[data-testid="primaryColumn"] span:has-text("@")')
-                username = await profile_name.inner_text() if profile_name else ""
-            except Exception as e:
-                logging.warning(f"Failed to get username: {str(e)}")
-                username = ""
+            # 缓存命中时直接解析缓存的接口响应，不打开页面
+            with self.run_metrics.stage('profile'):
+                cached = self.cached_timeline(url, high_water) if self.page_cache else None
+                if cached:
+                    username, tweets = cached
+                else:
+                    username, tweets = await self.browse_profile(url, high_water)
             
-            # 获取推文
-            tweets = await self.get_tweets(self.page)
+            if self.state_store:
+                self.state_store.update(url, tweets)
+            # 跳过已经从任一来源抓取过的推文
+            if self.tweet_index:
+                tweets = self.tweet_index.filter_new(tweets)
             
             result = {
                 'url': url,
@@ -74,145 +255,362 @@ class TwitterCrawler:
                 'success': True
             }
             
-            logging.info(f"Successfully crawled {url}: found {len(tweets)} tweets")
+            self.run_metrics.inc('tweets_total', len(tweets))
+            logging.info(f"Successfully crawled {url}: found {len(tweets)} new tweets")
             return result
             
         except Exception as e:
             logging.error(f"Error crawling {url}: {str(e)}")
-            return {
-                'url': url,
-                'timestamp': datetime.now().isoformat(),
-                'error': str(e),
-                'success': False
-            }
+            return failed_result(url, e)
 
-    async def get_tweets(self, page, max_tweets=3):
-        """获取跳过置顶后的前三条推文"""
-        tweets = []
+    def cached_timeline(self, url, high_water=None):
+        """从页面缓存取 (用户名, 推文)，未命中返回 None（重放模式下抛出 CacheMissError）"""
+        with self.run_metrics.stage('cache_lookup'):
+            body = self.page_cache.get_text(url, 'twitter')
+        if body is None:
+            if self.page_cache.replay:
+                raise CacheMissError(f"No cached timeline for {url}")
+            return None
+        with self.run_metrics.stage('extract'):
+            cached = json.loads(body)
+            tweets = take_new_tweets(parse_timeline_responses(cached['payloads'])[:MAX_TIMELINE_ITEMS], high_water)
+        self.run_metrics.inc('pages_total', path='cache')
+        logging.info(f"Served {url} from the page cache: found {len(tweets)} new tweets")
+        return cached['username'], tweets
+
+    async def browse_profile(self, url, high_water=None):
+        """打开主页，返回 (用户名, 推文)"""
+        # 在打开页面前开始监听时间线接口响应
+        capture = TimelineCapture()
+        self.page.on('response', capture.on_response)
         
-        # 获取所有推文元素
-        tweet_elements = await page.query_selector_all('article[data-testid="tweet"]')
-        logging.info(f"Found {len(tweet_elements)} tweets on the page")
+        # 访问用户主页
+        try:
+            # 按主机限速，替代固定的5-8秒等待
+            with self.run_metrics.stage('rate_limit_wait'):
+                await self.rate_limiter.acquire(url)
+            with self.run_metrics.stage('goto'):
+                response = await self.page.goto(url)
+            if response:
+                self.rate_limiter.record(url, response.status,
+                                         retry_after=parse_retry_after(response.headers.get('retry-after')))
+            
+            # 等待时间线接口响应，没有的话再等待推文区域加载
+            with self.run_metrics.stage('wait_for_timeline'):
+                try:
+                    await asyncio.wait_for(capture.ready.wait(), timeout=10)
+                    logging.info("Timeline response captured")
+                except asyncio.TimeoutError:
+                    try:
+                        await self.page.wait_for_selector('article[data-testid="tweet"]', timeout=5000)
+                        logging.info("Tweet area loaded successfully")
+                    except Exception as e:
+                        logging.warning(f"Timeout waiting for tweet area: {str(e)}")
+                        # 继续执行，因为页面可能已经部分加载
+            
+        except Exception as e:
+            logging.warning(f"Page navigation warning: {str(e)}")
+            # 继续执行，因为页面可能已经加载
         
-        # 跳过置顶推文，获取接下来的三条
-        for tweet in tweet_elements[0:4]:  # 跳过第一个（置顶），取接下来的三个
-            try:
-                # 获取推文链接
-                tweet_link = await tweet.query_selector('a[href*="/status/"]')
-                tweet_url = await tweet_link.get_attribute('href') if tweet_link else ""
-                if tweet_url:
-                    tweet_url = f"https://twitter.com{tweet_url}"
-                
-                # 获取时间戳
-                time_element = await tweet.query_selector('time')
-                if not time_element:
-                    continue
-                    
-                timestamp_str = await time_element.get_attribute('datetime')
-                if not timestamp_str:
-                    continue
-                
-                # 获取推文文本
-                text_element = await tweet.query_selector('div[data-testid="tweetText"]')
-                text = await text_element.inner_text() if text_element else ""
-                
-                if not text:
-                    continue
-                
-                # 获取互动数据
-                metrics = {}
-                for metric in ['retweet', 'reply', 'like']:
-                    metric_element = await tweet.query_selector(f'div[data-testid="{metric}"]')
-                    if metric_element:
-                        count_text = await metric_element.inner_text()
-                        metrics[metric] = int(count_text) if count_text.isdigit() else 0
-                
-                tweet_data = {
-                    'text': text,
-                    'timestamp': timestamp_str,
-                    'url': tweet_url,
-                    'metrics': metrics
-                }
-                
-                tweets.append(tweet_data)
-                    
-            except Exception as e:
-                logging.error(f"Error extracting tweet data: {str(e)}")
+        # 获取用户信息
+        try:
+            with self.run_metrics.stage('username'):
+                profile_name = await self.page.query_selector('div[data-testid="primaryColumn"] span:has-text("@")')
+                username = await profile_name.inner_text() if profile_name else ""
+        except Exception as e:
+            logging.warning(f"Failed to get username: {str(e)}")
+            username = ""
+        
+        # 获取推文（只保留上次抓取之后的新推文）
+        try:
+            with self.run_metrics.stage('extract'):
+                tweets = await self.get_tweets(self.page, capture=capture, high_water=high_water)
+        finally:
+            self.page.remove_listener('response', capture.on_response)
+        self.run_metrics.inc('pages_total', path='browser')
+        self.run_metrics.inc('bytes_total', capture.bytes, path='graphql')
+        
+        # 缓存接口响应，之后可以离线重放
+        if self.page_cache and capture.payloads:
+            with self.run_metrics.stage('cache_store'):
+                self.page_cache.put(url, 'twitter', json.dumps({'username': username, 'payloads': capture.payloads}),
+                                    content_type='application/json')
+        return username, tweets
+
+    async def get_tweets(self, page, max_tweets=3, capture=None, high_water=None):
+        """获取时间线前几条推文：优先使用捕获的接口响应，否则一次性批量提取DOM"""
+        if capture:
+            await capture.drain()
+            tweets = parse_timeline_responses(capture.payloads)
+            if tweets:
+                tweets = take_new_tweets(tweets[:MAX_TIMELINE_ITEMS], high_water)
+                logging.info(f"Collected {len(tweets)} tweets from {len(capture.payloads)} timeline responses")
+                return tweets
+            logging.info("No timeline responses captured, falling back to DOM extraction")
+            self.run_metrics.inc('dom_fallbacks_total')
+        
+        # 一次 evaluate 取回所有推文元素的数据
+        items = await page.evaluate(TWEETS_EXTRACT_JS)
+        logging.info(f"Found {len(items)} tweets on the page")
+        
+        tweets = []
+        for item in items[:MAX_TIMELINE_ITEMS]:
+            if not item.get('datetime') or not item.get('text'):
                 continue
+            
+            tweet_url = item.get('href') or ""
+            if tweet_url:
+                tweet_url = f"https://twitter.com{tweet_url}"
+            
+            tweets.append({
+                'id': tweet_id_from_url(tweet_url),
+                'text': item['text'],
+                'timestamp': item['datetime'],
+                'url': tweet_url,
+                'metrics': {name: parse_count(count) for name, count in item.get('metrics', {}).items()},
+                'pinned': item.get('pinned', False),
+                'is_retweet': item.get('is_retweet', False)
+            })
         
+        tweets = take_new_tweets(tweets, high_water)
         logging.info(f"Successfully collected {len(tweets)} tweets")
         return tweets
 
-async def main():
+# 默认探测的 Chrome 远程调试端口
+DEFAULT_PORTS = [9222, 9223, 9224, 9225, 9226]
+
+async def connect_browsers(playwright, ports):
+    """并发探测所有调试端口，返回所有能连上的 (port, browser)"""
+    async def connect(port):
+        try:
+            logging.info(f"Trying to connect to Chrome on port {port}...")
+            browser = await playwright.chromium.connect_over_cdp(f"http://localhost:{port}", timeout=5000)
+            logging.info(f"Successfully connected to Chrome on port {port}")
+            return port, browser
+        except Exception as e:
+            logging.warning(f"Failed to connect to port {port}: {str(e)}")
+            return None
+    
+    return [shard for shard in await asyncio.gather(*(connect(port) for port in ports)) if shard]
+
+async def open_tabs(browser, tabs):
+    """使用已登录上下文的第一个标签页，不够再新开；返回 (所有标签页, 新开的标签页)"""
+    context = browser.contexts[0]
+    pages = list(context.pages[:1])
+    created = []
+    while len(pages) < tabs:
+        page = await context.new_page()
+        pages.append(page)
+        created.append(page)
+    return pages, created
+
+async def shard_worker(name, crawler, browser, scheduler, checkpoint, total):
+    """从重试调度器取主页抓取；所在 Chrome 断开时把任务交还后退出"""
+    while True:
+        item = await scheduler.get()
+        if item is None:
+            return
+        index, url = item
+        
+        if browser and not browser.is_connected():
+            await scheduler.requeue(item)
+            logging.warning(f"[{name}] Chrome disconnected, handing {url} back to the queue")
+            return
+        
+        logging.info(f"[{name}] Processing {url} ({index+1}/{total})")
+        result = await crawler.crawl_profile(url)
+        if not result['success']:
+            crawler.run_metrics.error(result['error_type'])
+        
+        if not result['success'] and browser and not browser.is_connected():
+            await scheduler.requeue(item)
+            logging.warning(f"[{name}] Chrome disconnected while crawling, handing {url} back to the queue")
+            return
+        
+        # 最终结果（成功或重试用尽）立即追加到检查点
+        if await scheduler.done(item, result):
+            checkpoint.append(result)
+
+async def main(incremental=True, resume=False, ports=DEFAULT_PORTS, tabs_per_instance=1, deadline=None,
+               cache_dir=DEFAULT_CACHE_DIR, replay=False, metrics_file=TWITTER_METRICS_FILE,
+               store_path=DEFAULT_STORE_PATH, use_cache=False, block_resources=True, allow_domains=(),
+               deny_domains=()):
     async with async_playwright() as playwright:
-        # 尝试不同的端口连接到已存在的Chrome实例
-        ports = [9222, 9223, 9224, 9225, 9226]
-        browser = None
+        # 重放模式只读页面缓存：不连接 Chrome，也不更新增量记录
+        if replay:
+            shards = []
+            incremental = False
+        else:
+            # 连接所有能找到的 Chrome 实例（每个实例登录一个账号）
+            shards = await connect_browsers(playwright, ports)
+            if not shards:
+                raise Exception("Could not connect to any Chrome instance. Please make sure Chrome is running with remote debugging enabled.")
+        # 正常抓取只写缓存，除非指定 --use-cache
+        page_cache = PageCache(cache_dir, replay=replay, read=use_cache) if cache_dir else None
         
-        for port in ports:
-            try:
-                logging.info(f"Trying to connect to Chrome on port {port}...")
-                browser = await playwright.chromium.connect_over_cdp(f"http://localhost:{port}")
-                logging.info(f"Successfully connected to Chrome on port {port}")
-                break
-            except Exception as e:
-                logging.warning(f"Failed to connect to port {port}: {str(e)}")
-                continue
+        # 拦截图片、视频、字体和统计请求（--no-block 关闭）
+        blocker = ResourceBlocker(block_types=TWITTER_BLOCK_TYPES, deny_domains=TRACKER_DOMAINS + list(deny_domains),
+                                  allow_domains=allow_domains) if block_resources else None
         
-        if not browser:
-            raise Exception("Could not connect to any Chrome instance. Please make sure Chrome is running with remote debugging enabled.")
+        os.makedirs('twitter_results', exist_ok=True)
+        state_store = CrawlStateStore(TWITTER_STATE_FILE) if incremental else None
+        tweet_index = TweetIndex() if incremental else None
         
-        context = browser.contexts[0]  # 使用第一个上下文
-        page = context.pages[0]  # 使用第一个页面
+        # 每个实例一个限速器（各账号的频率额度独立），每个标签页一个 worker
+        run_metrics = RunMetrics('twitter')
+        workers = []
+        opened = []
+        for port, browser in shards:
+            rate_limiter = HostRateLimiter()
+            pages, created = await open_tabs(browser, tabs_per_instance)
+            opened.append((browser, pages, created))
+            for tab, page in enumerate(pages):
+                if blocker:
+                    await blocker.install(page)
+                crawler = TwitterCrawler(rate_limiter=rate_limiter, state_store=state_store, tweet_index=tweet_index,
+                                         page_cache=page_cache, run_metrics=run_metrics)
+                crawler.page = page
+                workers.append((f"port {port} tab {tab}", crawler, browser))
+        if replay:
+            workers.append(("replay", TwitterCrawler(page_cache=page_cache, run_metrics=run_metrics), None))
         
-        crawler = TwitterCrawler()
-        crawler.page = page
+        # 断点续爬：跳过检查点里已经成功的主页，并恢复它们的增量记录
+        done_urls = set()
+        if resume:
+            for record in read_checkpoint(TWITTER_CHECKPOINT_FILE):
+                if record.get('success'):
+                    done_urls.add(record['url'])
+                    if state_store:
+                        state_store.update(record['url'], record.get('tweets', []))
+                    if tweet_index:
+                        tweet_index.filter_new(record.get('tweets', []))
+            logging.info(f"Resuming: {len(done_urls)} profiles already crawled")
+        checkpoint = JsonlCheckpoint(TWITTER_CHECKPOINT_FILE, resume=resume)
         
-        results = []
-        failed_urls = []
+        # 上次重试用尽的主页优先抓取
+        dead_urls = load_dead_letters(TWITTER_DEAD_LETTER_FILE)
+        if dead_urls:
+            logging.info(f"Retrying {len(dead_urls)} dead-lettered profiles first")
+        pending = [item for item in order_with_dead_letters(TWITTER_URLS, dead_urls) if item[1] not in done_urls]
+        scheduler = RetryScheduler(pending, deadline=deadline)
         
-        for i, url in enumerate(TWITTER_URLS):
-            logging.info(f"Processing {url} ({i+1}/{len(TWITTER_URLS)})")
-            
-            # 添加延迟避免频率限制
-            if i > 0:
-                await asyncio.sleep(5)
-            
-            result = await crawler.crawl_profile(url)
-            results.append(result)
-            
-            if not result['success']:
-                failed_urls.append(url)
+        try:
+            logging.info(f"Crawling {len(pending)} profiles with {len(workers)} workers on {len(shards)} Chrome instances")
+            started = time.monotonic()
+            # 所有 worker 退出即结束：队列处理完、超过截止时间或所有实例都断开
+            await asyncio.gather(*(shard_worker(name, crawler, browser, scheduler, checkpoint, len(TWITTER_URLS))
+                                   for name, crawler, browser in workers))
+            wall_time = time.monotonic() - started
             
-            # 定期保存结果
-            if (i + 1) % 5 == 0:
-                with open('twitter_results/twitter_results_temp.json', 'w', encoding='utf-8') as f:
-                    json.dump(results, f, ensure_ascii=False, indent=2)
-                logging.info("Saved intermediate results to twitter_results/twitter_results_temp.json")
-        
-        # 保存最终结果
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            if replay or any(browser.is_connected() for _, browser in shards):
+                scheduler.finish()
+            else:
+                scheduler.finish('all Chrome instances disconnected')
+            if not replay:
+                write_dead_letters(TWITTER_DEAD_LETTER_FILE, scheduler.dead)
+        finally:
+            checkpoint.close()
+        
+        # 从检查点流式生成最终结果（增量模式下只输出有新推文的主页）；文件名带微秒，同一秒结束的两次运行不会互相覆盖
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         final_filename = f'twitter_results/twitter_results_{timestamp}.json'
-        with open(final_filename, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        keep = (lambda r: not r['success'] or r['tweets']) if incremental else None
+        summary = consolidate(TWITTER_CHECKPOINT_FILE, final_filename, TWITTER_URLS, keep=keep)
+        failed_urls = summary['failed_urls']
+        if incremental:
+            logging.info(f"{summary['total'] - summary['written']} profiles have no new tweets")
+        
+        # 结果落盘后再更新增量记录
+        if state_store:
+            state_store.save()
+        if tweet_index:
+            logging.info(f"Indexed {tweet_index.commit()} newly crawled tweets")
+            tweet_index.close()
+        # 写入推文库；重放的结果已经在库里了
+        if store_path and not replay:
+            tweet_store = TweetStore(store_path)
+            try:
+                stored = tweet_store.add_results(read_checkpoint(TWITTER_CHECKPOINT_FILE), 'twitter')
+            finally:
+                tweet_store.close()
+            logging.info(f"Stored {stored} tweets in {store_path}")
+        os.remove(TWITTER_CHECKPOINT_FILE)
         
         # 保存失败的URL
         if failed_urls:
             failed_filename = f'twitter_results/failed_urls_{timestamp}.txt'
-            with open(failed_filename, 'w', encoding='utf-8') as f:
-                for url in failed_urls:
-                    f.write(f"{url}\n")
+            write_failed_urls(failed_filename, failed_urls)
             logging.warning(f"Failed to crawl {len(failed_urls)} URLs. See {failed_filename} for details")
         
-        await browser.close()
+        # 这些是用户自己的 Chrome，断开前移除拦截并关闭新开的标签页
+        for browser, pages, created in opened:
+            if not browser.is_connected():
+                continue
+            for page in pages:
+                if blocker and page not in created:
+                    await blocker.uninstall(page)
+            for page in created:
+                await page.close()
+            await browser.close()
         
         logging.info(f"Crawling completed! Final results saved to {final_filename}")
-        logging.info(f"Successfully crawled: {len(results) - len(failed_urls)} URLs")
+        logging.info(f"Successfully crawled: {summary['total'] - len(failed_urls)} URLs")
         logging.info(f"Failed to crawl: {len(failed_urls)} URLs")
+        if scheduler.retries:
+            logging.info(f"Retries by error type: {dict(scheduler.retries)}")
+        if scheduler.dead and not replay:
+            logging.warning(f"{len(scheduler.dead)} profiles dead-lettered to {TWITTER_DEAD_LETTER_FILE}")
+        logging.info(f"Wall time: {wall_time:.1f}s with {len(workers)} workers on {len(shards)} Chrome instances")
+        if blocker:
+            blocker.log_summary()
+        if page_cache:
+            page_cache.log_summary()
+            page_cache.close()
+        
+        # 导出本次运行的各阶段耗时和计数
+        for error_type, count in scheduler.retries.items():
+            run_metrics.inc('retries_total', count, error_type=error_type)
+        run_metrics.inc('dead_letters_total', len(scheduler.dead))
+        run_metrics.set('profiles', summary['total'])
+        run_metrics.set('failed_profiles', len(failed_urls))
+        run_metrics.finish()
+        run_metrics.log_summary()
+        summary_file = f'twitter_results/run_summary_{timestamp}.json'
+        run_metrics.write(metrics_file, summary_file)
+        logging.info(f"Run metrics written to {metrics_file} and {summary_file}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="通过已登录的 Chrome 抓取 X 用户推文")
+    parser.add_argument('--full', action='store_true', help="忽略增量记录和推文索引，重新提取所有推文")
+    parser.add_argument('--resume', action='store_true', help="从检查点继续，跳过已经成功的主页")
+    parser.add_argument('--ports', default=','.join(str(port) for port in DEFAULT_PORTS),
+                        help="要连接的 Chrome 调试端口，逗号分隔（默认 9222-9226）")
+    parser.add_argument('--tabs-per-instance', type=int, default=1, help="每个 Chrome 实例使用的标签页数")
+    parser.add_argument('--deadline', type=float, default=None, help="整体截止时间（分钟），未完成的主页进入死信文件")
+    parser.add_argument('--no-block', action='store_true', help="不拦截图片、视频和字体")
+    parser.add_argument('--allow-domains', default='', help="从不拦截的域名，逗号分隔（页面缺了某个资源无法显示时放行）")
+    parser.add_argument('--deny-domains', default='', help="总是拦截的域名，逗号分隔（在内置的统计域名之外）")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help=f"页面缓存目录（默认 {DEFAULT_CACHE_DIR}）")
+    parser.add_argument('--no-cache', action='store_true', help="不读写页面缓存")
+    parser.add_argument('--use-cache', action='store_true', help="缓存有效期（1 小时）内的主页直接读缓存，不重新抓取（默认只写缓存）")
+    parser.add_argument('--replay', action='store_true', help="只从页面缓存重放，不连接 Chrome、不访问网络")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"结果写入的 SQLite 推文库（默认 {DEFAULT_STORE_PATH}）")
+    parser.add_argument('--no-store', action='store_true', help="只写 JSON 结果文件")
+    parser.add_argument('--metrics-file', default=TWITTER_METRICS_FILE,
+                        help=f"本次运行指标的 Prometheus 文本文件，可指向 node_exporter 的 textfile 目录（默认 {TWITTER_METRICS_FILE}）")
+    args = parser.parse_args()
+    if args.no_cache and (args.replay or args.use_cache):
+        parser.error("--replay 和 --use-cache 需要页面缓存")
+    ports = [int(port) for port in args.ports.split(',') if port.strip()]
+    
     try:
-        asyncio.run(main())
+        asyncio.run(main(incremental=not args.full, resume=args.resume, ports=ports,
+                         tabs_per_instance=max(1, args.tabs_per_instance),
+                         deadline=args.deadline * 60 if args.deadline else None,
+                         cache_dir=None if args.no_cache else args.cache_dir, replay=args.replay,
+                         metrics_file=args.metrics_file, store_path=None if args.no_store else args.store,
+                         use_cache=args.use_cache, block_resources=not args.no_block,
+                         allow_domains=split_domains(args.allow_domains), deny_domains=split_domains(args.deny_domains)))
     except KeyboardInterrupt:
         logging.warning("Crawling interrupted by user")
     except Exception as e: